@@ -0,0 +1,151 @@
+"""
+Сравнение хранилищ медиафайлов
+
+Загружает одинаковый набор файлов через:
+    s3     - S3Storage (aiohttp, параллельные части multipart)
+    boto3  - прежний путь: boto3 в пуле потоков, части по очереди
+    local  - LocalStorage во временный каталог
+
+По умолчанию поднимает moto на localhost (pip install "moto[server]");
+для MinIO укажите --endpoint и ключи доступа.
+
+    python -m benchmarks.media_storage --files 30 --size 8 --concurrency 3
+    python -m benchmarks.media_storage --endpoint http://127.0.0.1:9000 \\
+        --access-key minioadmin --secret-key minioadmin
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable, List
+
+import boto3
+
+from settings.config import DOWNLOAD_CHUNK_SIZE, S3_PART_SIZE
+from utils.http_client import create_http_session
+from utils.media_storage import LocalStorage, MediaStorage, S3Storage
+
+BUCKET = 'benchmark'
+MIB = 1024 * 1024
+
+
+async def iter_chunks(data: bytes) -> AsyncIterator[bytes]:
+    """Содержимое файла чанками, как при скачивании из Telegram"""
+    for start in range(0, len(data), DOWNLOAD_CHUNK_SIZE):
+        yield data[start:start + DOWNLOAD_CHUNK_SIZE]
+        await asyncio.sleep(0)
+
+
+def boto3_upload(client, key: str, data: bytes):
+    """Прежняя реализация: put_object или последовательный multipart"""
+    if len(data) < S3_PART_SIZE:
+        client.put_object(Bucket=BUCKET, Key=key, Body=data, ContentType='image/jpeg')
+        return
+
+    upload_id = client.create_multipart_upload(Bucket=BUCKET, Key=key, ContentType='image/jpeg')['UploadId']
+    parts = []
+    for number, start in enumerate(range(0, len(data), S3_PART_SIZE), start=1):
+        response = client.upload_part(
+            Bucket=BUCKET, Key=key, UploadId=upload_id, PartNumber=number,
+            Body=data[start:start + S3_PART_SIZE]
+        )
+        parts.append({'PartNumber': number, 'ETag': response['ETag']})
+    client.complete_multipart_upload(
+        Bucket=BUCKET, Key=key, UploadId=upload_id, MultipartUpload={'Parts': parts}
+    )
+
+
+async def run_backend(
+    name: str,
+    upload: Callable[[str, bytes], Awaitable],
+    payloads: List[bytes],
+    concurrency: int
+):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(data: bytes):
+        async with semaphore:
+            started = time.perf_counter()
+            await upload(f"bench/{uuid.uuid4().hex}.jpg", data)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(data) for data in payloads))
+    elapsed = time.perf_counter() - started
+
+    total_mib = sum(len(data) for data in payloads) / MIB
+    latencies.sort()
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(
+        f"{name:<6} {elapsed:7.2f} с  {total_mib / elapsed:7.1f} МБ/с  "
+        f"медиана {statistics.median(latencies) * 1000:7.0f} мс  p95 {p95 * 1000:7.0f} мс"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Сравнение хранилищ медиафайлов")
+    parser.add_argument('--files', type=int, default=30, help="количество файлов")
+    parser.add_argument('--size', type=float, default=8, help="размер файла, МБ")
+    parser.add_argument('--concurrency', type=int, default=3, help="одновременных загрузок")
+    parser.add_argument('--endpoint', help="S3 endpoint (по умолчанию - локальный moto)")
+    parser.add_argument('--access-key', default='benchmark')
+    parser.add_argument('--secret-key', default='benchmark')
+    parser.add_argument('--region', default='us-east-1')
+    args = parser.parse_args()
+
+    moto_server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        from moto.server import ThreadedMotoServer
+        moto_server = ThreadedMotoServer(port=0)
+        moto_server.start()
+        host, port = moto_server.get_host_and_port()
+        endpoint = f"http://{host}:{port}"
+
+    client = boto3.client(
+        's3', endpoint_url=endpoint, region_name=args.region,
+        aws_access_key_id=args.access_key, aws_secret_access_key=args.secret_key
+    )
+    try:
+        client.create_bucket(Bucket=BUCKET)
+    except client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+
+    payloads = [os.urandom(int(args.size * MIB)) for _ in range(args.files)]
+    print(f"{args.files} файлов по {args.size} МБ, одновременно {args.concurrency}, endpoint {endpoint}")
+
+    session = create_http_session()
+    s3_storage: MediaStorage = S3Storage(
+        session, endpoint_url=endpoint, bucket=BUCKET, region=args.region,
+        access_key=args.access_key, secret_key=args.secret_key, acl=''
+    )
+    boto3_pool = ThreadPoolExecutor(max_workers=args.concurrency)
+    loop = asyncio.get_running_loop()
+
+    try:
+        await run_backend(
+            's3', lambda key, data: s3_storage.save(key, iter_chunks(data)), payloads, args.concurrency
+        )
+        await run_backend(
+            'boto3', lambda key, data: loop.run_in_executor(boto3_pool, boto3_upload, client, key, data),
+            payloads, args.concurrency
+        )
+        with tempfile.TemporaryDirectory() as root:
+            local_storage = LocalStorage(root, 'http://localhost/media')
+            await run_backend(
+                'local', lambda key, data: local_storage.save(key, iter_chunks(data)), payloads, args.concurrency
+            )
+    finally:
+        boto3_pool.shutdown()
+        await session.close()
+        if moto_server is not None:
+            moto_server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
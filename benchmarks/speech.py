@@ -0,0 +1,142 @@
+"""
+Сравнение движков распознавания речи
+
+Каталог с записями: голосовые (.ogg, .oga, .mp3, .wav, .m4a) и рядом
+с каждой - эталонный текст в файле с тем же именем и расширением .txt
+(необязательно, нужен для WER). Записи сотрудников в репозиторий не
+добавляются - соберите набор локально.
+
+Для каждого движка выводится время загрузки, медиана и p95 задержки,
+RTF (время распознавания / длительность записи) и WER.
+
+    python -m benchmarks.speech benchmarks/fixtures/speech --engines vosk google
+"""
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import time
+from typing import List, Optional, Tuple
+
+from settings.config import SPEECH_SAMPLE_RATE
+from utils.audio import SAMPLE_WIDTH, decode_to_pcm
+from utils.executors import executors
+from utils.speech import SpeechEngine, create_speech_engine
+
+AUDIO_EXTENSIONS = ('.ogg', '.oga', '.mp3', '.wav', '.m4a')
+
+
+class Clip:
+    def __init__(self, name: str, pcm: bytes, reference: Optional[str]):
+        self.name = name
+        self.pcm = pcm
+        self.reference = reference
+        self.duration = len(pcm) / (SPEECH_SAMPLE_RATE * SAMPLE_WIDTH)
+
+
+def normalize(text: str) -> List[str]:
+    text = text.lower().replace('ё', 'е')
+    return re.sub(r'[^\w\s]', ' ', text).split()
+
+
+def word_errors(reference: str, hypothesis: str) -> Tuple[int, int]:
+    """(ошибок, слов в эталоне) по расстоянию Левенштейна между словами"""
+    ref, hyp = normalize(reference), normalize(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, start=1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word)
+            ))
+        previous = current
+    return previous[-1], len(ref)
+
+
+async def load_clips(directory: str) -> List[Clip]:
+    clips = []
+    for filename in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(filename)
+        if extension.lower() not in AUDIO_EXTENSIONS:
+            continue
+
+        with open(os.path.join(directory, filename), 'rb') as file:
+            pcm = await decode_to_pcm(file.read())
+
+        reference = None
+        reference_path = os.path.join(directory, f"{stem}.txt")
+        if os.path.exists(reference_path):
+            with open(reference_path, encoding='utf-8') as file:
+                reference = file.read().strip()
+        clips.append(Clip(filename, pcm, reference))
+    return clips
+
+
+async def run_engine(name: str, engine: SpeechEngine, clips: List[Clip], repeat: int):
+    started = time.perf_counter()
+    await engine.start()
+    load_time = time.perf_counter() - started
+
+    latencies = []
+    rtfs = []
+    errors = words = failed = 0
+    for _ in range(repeat):
+        for clip in clips:
+            started = time.perf_counter()
+            try:
+                text = await engine.recognize(clip.pcm) or ''
+            except Exception as e:
+                print(f"  {name}: {clip.name}: {e}")
+                failed += 1
+                continue
+            elapsed = time.perf_counter() - started
+            latencies.append(elapsed)
+            rtfs.append(elapsed / clip.duration if clip.duration else 0)
+            if clip.reference is not None:
+                clip_errors, clip_words = word_errors(clip.reference, text)
+                errors += clip_errors
+                words += clip_words
+
+    if not latencies:
+        print(f"{name:<8} все распознавания завершились ошибкой")
+        return
+
+    latencies.sort()
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    wer = f"{errors / words * 100:5.1f} %" if words else "    -"
+    print(
+        f"{name:<8} загрузка {load_time:6.2f} с  медиана {statistics.median(latencies) * 1000:7.0f} мс  "
+        f"p95 {p95 * 1000:7.0f} мс  RTF {statistics.mean(rtfs):5.2f}  WER {wer}  ошибок {failed}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Сравнение движков распознавания речи")
+    parser.add_argument('clips', help="каталог с записями и эталонными .txt")
+    parser.add_argument('--engines', nargs='+', default=['vosk', 'google'], help="движки (google, vosk)")
+    parser.add_argument('--repeat', type=int, default=1, help="повторов набора")
+    args = parser.parse_args()
+
+    clips = await load_clips(args.clips)
+    if not clips:
+        parser.error(f"В каталоге {args.clips} нет записей")
+    total = sum(clip.duration for clip in clips)
+    print(f"{len(clips)} записей, {total:.1f} с аудио, частота {SPEECH_SAMPLE_RATE} Гц")
+
+    try:
+        for name in args.engines:
+            # Без запасного движка - измеряется только выбранный
+            engine = create_speech_engine(name, fallback='')
+            try:
+                await run_engine(name, engine, clips, args.repeat)
+            finally:
+                await engine.close()
+    finally:
+        executors.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
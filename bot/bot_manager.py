@@ -6,10 +6,16 @@ import logging
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 
-from settings.config import BOT_TOKEN
-from settings.database import Database
+from settings.config import BOT_TOKEN, METRICS_LOG_INTERVAL
 from utils.google_sheets import GoogleSheetsManager
-from .handlers import router, sheets_manager
+from utils.executors import executors
+from utils.http_client import create_http_session
+from utils.rate_limiter import rate_limiter
+from .middlewares import RateLimitRequestMiddleware
+from .handlers import (
+    router, sheets_manager, sheets_sync, db, complaint_pipeline, media_handler, transcription_queue,
+    collect_metrics, format_metrics
+)
 
 # Настройка логирования
 logging.basicConfig(
@@ -26,24 +32,47 @@ class BotManager:
         self.bot = None
         self.dp = None
         self.db = None
+        self.http_session = None
+        self.metrics_task = None
     
     async def initialize(self):
         """Инициализация компонентов бота"""
         try:
             # Инициализация бота и диспетчера
             self.bot = Bot(token=BOT_TOKEN)
+            self.bot.session.middleware(RateLimitRequestMiddleware(rate_limiter))
             storage = MemoryStorage()
             self.dp = Dispatcher(storage=storage)
             
             # Подключение роутеров
             self.dp.include_router(router)
             
-            # Инициализация базы данных
-            self.db = Database()
+            # Инициализация базы данных (общий экземпляр с обработчиками)
+            self.db = db
             await self.db.initialize()
             
+            # Общий HTTP-клиент для скачивания файлов и запросов к Google
+            self.http_session = create_http_session()
+            media_handler.set_session(self.http_session)
+            
+            # Офлайн-модель распознавания речи загружается до первого голосового
+            await media_handler.speech_engine.start()
+            
             # Инициализация Google Sheets
-            await sheets_manager.initialize()
+            await sheets_manager.initialize(self.http_session)
+            
+            # Дозапись в Google Sheets очереди, оставшейся с прошлого запуска
+            sheets_sync.start()
+            
+            # Фоновая обработка предложений
+            complaint_pipeline.start()
+            
+            # Очередь распознавания голосовых комментариев
+            transcription_queue.start()
+            
+            # Периодическая запись метрик в журнал
+            if METRICS_LOG_INTERVAL > 0:
+                self.metrics_task = asyncio.create_task(self._log_metrics(), name="metrics-log")
             
             logger.info("Все компоненты бота успешно инициализированы")
             
@@ -63,11 +92,32 @@ class BotManager:
             logger.error(f"Ошибка при работе бота: {e}")
             raise
         finally:
-            if self.bot:
-                await self.bot.session.close()
+            await self.stop()
+    
+    async def _log_metrics(self):
+        """Запись метрик в журнал раз в METRICS_LOG_INTERVAL секунд"""
+        while True:
+            await asyncio.sleep(METRICS_LOG_INTERVAL)
+            try:
+                logger.info("Метрики: " + "; ".join(format_metrics(await collect_metrics())))
+            except Exception as e:
+                logger.warning(f"Не удалось собрать метрики: {e}")
     
     async def stop(self):
         """Остановка бота"""
+        if self.metrics_task:
+            self.metrics_task.cancel()
+            await asyncio.gather(self.metrics_task, return_exceptions=True)
+        await transcription_queue.stop()
+        await complaint_pipeline.stop()
+        await sheets_sync.stop()
+        await sheets_manager.close()
+        await media_handler.close()
+        executors.shutdown()
+        if self.http_session:
+            await self.http_session.close()
         if self.bot:
             await self.bot.session.close()
+        if self.db:
+            await self.db.close()
         logger.info("⏹️ Бот остановлен")
\ No newline at end of file
@@ -0,0 +1,240 @@
+"""
+Фоновая обработка отправленных предложений
+
+Обработчик кнопки "✅ Отправить" только ставит снимок данных FSM в очередь
+и сразу отвечает пользователю. Загрузка фото в S3 и запись в SQLite
+выполняются пулом воркеров, результат пользователь видит в
+отредактированном статусном сообщении. В Google Sheets жалоба попадает
+через очередь sheets_outbox (см. utils/sheets_sync.py).
+
+Если очередь заполнена, предложение не принимается (ComplaintQueueFull):
+обработчик не ждёт места в очереди, а просит отправить его чуть позже.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Dict, List, Optional
+
+from aiogram import Bot
+
+from settings.config import COMPLAINT_WORKERS, COMPLAINT_QUEUE_SIZE, COMPLAINT_SHUTDOWN_TIMEOUT
+from settings.database import Database
+from utils.media_handler import MediaHandler
+from utils.sheets_sync import SheetsSyncWorker
+from .enums import Messages
+
+logger = logging.getLogger(__name__)
+
+
+class ComplaintQueueFull(Exception):
+    """Очередь предложений заполнена"""
+
+
+@dataclass
+class ComplaintJob:
+    """Снимок предложения для фоновой обработки"""
+    bot: Bot
+    chat_id: int
+    status_message_id: int
+    telegram_id: int
+    employee_name: str
+    category: str
+    master: str
+    comment: str
+    photos: List[dict] = field(default_factory=list)
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class StageStats:
+    """Статистика длительности одного этапа обработки"""
+
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def record(self, duration: float, failed: bool = False):
+        self.count += 1
+        self.failures += int(failed)
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.last = duration
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'failures': self.failures,
+            'avg': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'last': self.last
+        }
+
+
+class ComplaintPipeline:
+    """Очередь предложений с ограниченным пулом воркеров"""
+
+    STAGES = ('queue', 'upload', 'database', 'total')
+
+    def __init__(
+        self,
+        db: Database,
+        media_handler: MediaHandler,
+        sheets_sync: SheetsSyncWorker,
+        workers: int = COMPLAINT_WORKERS,
+        max_queue_size: int = COMPLAINT_QUEUE_SIZE
+    ):
+        self.db = db
+        self.media_handler = media_handler
+        self.sheets_sync = sheets_sync
+        self.workers_count = max(1, workers)
+        self.max_queue_size = max_queue_size
+        self.stages = {stage: StageStats() for stage in self.STAGES}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._in_progress = 0
+        self.rejected = 0
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self):
+        """Запуск воркеров"""
+        if self.is_running:
+            return
+
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"complaint-worker-{i}")
+            for i in range(self.workers_count)
+        ]
+        logger.info(f"Очередь предложений запущена, воркеров: {self.workers_count}")
+
+    async def stop(self, timeout: float = COMPLAINT_SHUTDOWN_TIMEOUT):
+        """Остановка воркеров с дообработкой уже принятых предложений"""
+        if not self.is_running:
+            return
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не дождались обработки очереди, осталось предложений: {self._queue.qsize()}")
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info("Очередь предложений остановлена")
+
+    def submit(self, job: ComplaintJob):
+        """
+        Постановка предложения в очередь
+
+        Raises:
+            ComplaintQueueFull: Очередь заполнена
+        """
+        if not self.is_running:
+            raise RuntimeError("Очередь предложений не запущена")
+
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise ComplaintQueueFull()
+        logger.info(f"Предложение от {job.telegram_id} поставлено в очередь, глубина: {self._queue.qsize()}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Глубина очереди и длительность этапов"""
+        return {
+            'queue_depth': self._queue.qsize() if self._queue else 0,
+            'in_progress': self._in_progress,
+            'workers': len(self._workers),
+            'rejected': self.rejected,
+            'stages': {name: stats.as_dict() for name, stats in self.stages.items()}
+        }
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self._queue.get()
+            self._in_progress += 1
+            try:
+                await self._process(job)
+            except Exception as e:
+                logger.error(f"Воркер {index}: необработанная ошибка предложения: {e}")
+            finally:
+                self._in_progress -= 1
+                self._queue.task_done()
+
+    async def _timed(self, stage: str, coro: Awaitable) -> Any:
+        """Выполнение этапа с учётом его длительности"""
+        started = time.monotonic()
+        failed = True
+        try:
+            result = await coro
+            failed = result is False
+            return result
+        finally:
+            self.stages[stage].record(time.monotonic() - started, failed)
+
+    async def _process(self, job: ComplaintJob):
+        started = time.monotonic()
+        self.stages['queue'].record(started - job.enqueued_at)
+        text = Messages.COMPLAINT_ERROR.value
+        photos = []
+        failed_photos = 0
+        db_success = False
+
+        try:
+            # Загружаем фото в хранилище (если есть)
+            if job.photos:
+                uploads = await self._timed(
+                    'upload',
+                    self.media_handler.upload_photos(job.bot, job.photos, job.employee_name)
+                )
+                photos = [photo for photo, error in uploads if photo]
+                failed_photos = len(uploads) - len(photos)
+
+            # Сохраняем в базу данных вместе с очередью для Google Sheets
+            db_success = await self._timed('database', self.db.add_complaint(
+                employee_telegram_id=job.telegram_id,
+                category=job.category,
+                master_name=job.master,
+                comment=job.comment,
+                photo_urls=[photo.url for photo in photos],
+                thumbnail_urls=[photo.thumbnail_url or '' for photo in photos]
+            ))
+
+            if db_success:
+                # Фото сохранённого предложения можно использовать повторно
+                await self.db.register_media([
+                    (photo.content_hash, photo.file_unique_id, photo.url, photo.thumbnail_url, photo.size)
+                    for photo in photos if photo.content_hash
+                ])
+                self.sheets_sync.wake()
+                text = Messages.COMPLAINT_SAVED.value
+                if failed_photos:
+                    # Предложение сохранено без части фото - пользователь должен об этом знать
+                    text += Messages.COMPLAINT_PHOTOS_FAILED.value.format(
+                        failed=failed_photos, total=len(job.photos)
+                    )
+
+        except Exception as e:
+            logger.error(f"Ошибка отправки предложения: {e}")
+        finally:
+            self.stages['total'].record(time.monotonic() - started, not db_success)
+
+        if not db_success and photos:
+            # Предложение не сохранено - на его фото никто не ссылается
+            await self.media_handler.delete_photos(photos)
+
+        try:
+            await job.bot.edit_message_text(
+                text=text,
+                chat_id=job.chat_id,
+                message_id=job.status_message_id
+            )
+        except Exception as e:
+            logger.error(f"Не удалось обновить статус предложения: {e}")
@@ -9,6 +9,7 @@ class BotCommands(Enum):
     START = "/start"
     HELP = "/help"
     MENU = "/menu"
+    STATS = "/stats"
 
 
 class CallbackData(Enum):
@@ -100,10 +101,27 @@ class Messages(Enum):
         "Вы можете отправить текстовое сообщение или голосовое."
     )
     
+    TRANSCRIBING = "🎤 Анализируем аудио..."
+    TRANSCRIPTION_QUEUED = "🎤 Голосовое в очереди: {position}-е, ожидание около {eta} с"
+    TRANSCRIPTION_BUSY = (
+        "⏳ Сейчас распознаётся много голосовых сообщений.\n\n"
+        "Отправьте комментарий текстом или повторите голосовое чуть позже."
+    )
+    
     COMPLAINT_SAVED = (
         "✅ Предложение успешно отправлено! Большое спасибо за инициативу, ты умница 👍 "
     )
     
+    COMPLAINT_PHOTOS_FAILED = (
+        "\n\n⚠️ Не удалось сохранить фото: {failed} из {total}. "
+        "Отправьте их ещё одним предложением."
+    )
+    
+    COMPLAINT_BUSY = (
+        "⏳ Сейчас отправляется много предложений.\n\n"
+        "Нажмите «Отправить» ещё раз чуть позже."
+    )
+    
     COMPLAINT_ERROR = (
         "❌ Ошибка отправки предложение.\n\n"
         "Попробуйте ещё раз или обратитесь к администратору."
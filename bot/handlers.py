@@ -5,61 +5,122 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
+import asyncio
 import logging
+import math
+from typing import Any, Dict, List, Optional, Tuple
 
-from settings.config import TELEGRAM_ADMIN_ID
+from settings.config import MAX_PHOTO_SIZE, MAX_PHOTOS
 from settings.database import Database
 from utils.google_sheets import GoogleSheetsManager
+from utils.sheets_sync import SheetsSyncWorker
 from .states import ComplaintStates, EmployeeStates
 from .keyboards import Keyboards
 from .enums import CallbackData, Messages, Categories, ButtonTexts
+from .middlewares import AccessMiddleware, AlbumMiddleware
+from .complaint_pipeline import ComplaintPipeline, ComplaintJob, ComplaintQueueFull
+from .transcription_queue import TranscriptionQueue, TranscriptionQueueFull, TranscriptionCancelled
+from utils.executors import executors
 from utils.media_handler import MediaHandler
+from utils.rate_limiter import rate_limiter
+from utils.transcript_cache import TranscriptCache
 
 logger = logging.getLogger(__name__)
 router = Router()
 
 # Инициализация компонентов
 db = Database()
-media_handler = MediaHandler()
+media_handler = MediaHandler(db=db)
 sheets_manager = GoogleSheetsManager()
+sheets_sync = SheetsSyncWorker(db, sheets_manager)
+complaint_pipeline = ComplaintPipeline(db, media_handler, sheets_sync)
+transcription_queue = TranscriptionQueue(media_handler, TranscriptCache(db))
 
+# Роль и запись сотрудника определяются один раз на обновление,
+# неавторизованные пользователи отсекаются до проверки фильтров
+access_middleware = AccessMiddleware(db)
+router.message.outer_middleware(access_middleware)
+router.callback_query.outer_middleware(access_middleware)
+# Фото альбома обрабатываются одним вызовом обработчика с флагом album
+router.message.middleware(AlbumMiddleware())
 
-async def is_admin(user_id: int) -> bool:
-    """Проверка, является ли пользователь администратором"""
-    return int(user_id) == int(TELEGRAM_ADMIN_ID)
+Employee = Optional[Tuple[int, str]]
 
 
-async def has_access(user_id: int) -> bool:
-    """Проверка доступа пользователя к боту"""
-    if await is_admin(user_id):
-        return True
-    return await db.is_employee_active(user_id)
+async def discard_complaint_tasks(state: FSMContext):
+    """Отмена фоновых загрузок фото и распознавания голосовых незавершённого предложения"""
+    data = await state.get_data()
+    media_handler.discard_photo_uploads(data.get('photos', []))
+    transcription_queue.cancel(state.key)
+
+
+async def touch_complaint_uploads(state: FSMContext):
+    """Продление фоновых загрузок фото предложения, которое ещё заполняется"""
+    data = await state.get_data()
+    media_handler.touch_photo_uploads(data.get('photos', []))
+
+
+async def collect_metrics() -> Dict[str, Any]:
+    """Метрики очередей, кэшей и лимитов"""
+    return {
+        'complaints': complaint_pipeline.stats(),
+        'transcription': transcription_queue.stats(),
+        'sheets': {
+            'backlog': await sheets_sync.backlog(),
+            'synced': sheets_sync.synced,
+            'failed': sheets_sync.failed,
+            'buffered': sheets_manager.outbox.pending,
+            'flushes': sheets_manager.outbox.flushes
+        },
+        'rate_limits': rate_limiter.stats(),
+        'employees': db.employees.stats(),
+        'media': {'dedup_hits': media_handler.dedup_hits},
+        'executors': executors.stats()
+    }
+
+
+def format_metrics(metrics: Dict[str, Any], prefix: str = '') -> List[str]:
+    """Метрики построчно: путь.к.значению: значение"""
+    lines = []
+    for name, value in metrics.items():
+        if isinstance(value, dict):
+            lines.extend(format_metrics(value, f"{prefix}{name}."))
+        elif isinstance(value, float):
+            lines.append(f"{prefix}{name}: {value:.3f}")
+        else:
+            lines.append(f"{prefix}{name}: {value}")
+    return lines
+
+
+@router.message(Command("stats"))
+async def cmd_stats(message: Message, is_admin: bool):
+    """Метрики бота (только для администратора)"""
+    if not is_admin:
+        await message.answer("❌ Недостаточно прав")
+        return
+    
+    text = "\n".join(format_metrics(await collect_metrics()))
+    # Ограничение длины сообщения Telegram
+    await message.answer(text[:4000])
 
 
 @router.message(Command("start"))
-async def cmd_start(message: Message, state: FSMContext):
+async def cmd_start(message: Message, state: FSMContext, is_admin: bool, employee: Employee):
     """Обработчик команды /start"""
     # Проверяем, что это приватный чат
     if message.chat.type != "private":
         await message.answer("❌ Бот работает только в приватных чатах.")
         return
     
-    user_id = message.from_user.id
-    
-    # Проверяем доступ
-    if not await has_access(user_id):
-        await message.answer(Messages.ACCESS_DENIED.value)
-        return
-    
+    await discard_complaint_tasks(state)
     await state.clear()
     
     # Определяем тип пользователя и показываем соответствующее меню
-    if await is_admin(user_id):
+    if is_admin:
         keyboard = Keyboards.main_menu_admin()
         text = Messages.WELCOME_ADMIN.value
     else:
-        # Получаем имя сотрудника для персонализированного приветствия
-        employee = await db.get_employee_by_telegram_id(user_id)
+        # Имя сотрудника для персонализированного приветствия
         if employee:
             employee_name = employee[1]  # employee[1] содержит имя сотрудника
             text = f"👋 Здравствуйте, {employee_name}!\n\n{Messages.WELCOME_EMPLOYEE.value}"
@@ -74,18 +135,16 @@ async def cmd_start(message: Message, state: FSMContext):
 # === ОБРАБОТЧИКИ КНОПОК ГЛАВНОГО МЕНЮ ===
 
 @router.message(F.text == ButtonTexts.BACK_TO_MAIN.value)
-async def back_to_main(message: Message, state: FSMContext):
+async def back_to_main(message: Message, state: FSMContext, is_admin: bool, employee: Employee):
     """Возврат в главное меню"""
+    await discard_complaint_tasks(state)
     await state.clear()
     
-    user_id = message.from_user.id
-    
-    if await is_admin(user_id):
+    if is_admin:
         keyboard = Keyboards.main_menu_admin()
         text = Messages.WELCOME_ADMIN.value
     else:
-        # Получаем имя сотрудника для персонализированного приветствия
-        employee = await db.get_employee_by_telegram_id(user_id)
+        # Имя сотрудника для персонализированного приветствия
         if employee:
             employee_name = employee[1]  # employee[1] содержит имя сотрудника
             text = f"👋 Здравствуйте, {employee_name}!\n\n{Messages.WELCOME_EMPLOYEE.value}"
@@ -99,21 +158,17 @@ async def back_to_main(message: Message, state: FSMContext):
 @router.message(F.text == ButtonTexts.SEND_COMPLAINT.value)
 async def start_complaint_handler(message: Message, state: FSMContext):
     """Обработчик кнопки отправки предложения"""
-    # Проверяем доступ
-    if not await has_access(message.from_user.id):
-        await message.answer("❌ Доступ запрещён")
-        return
-    
     await start_complaint_process(message, state)
 
 @router.message(F.text == ButtonTexts.MANAGE_EMPLOYEES.value)
-async def employees_menu_handler(message: Message, state: FSMContext):
+async def employees_menu_handler(message: Message, state: FSMContext, is_admin: bool):
     """Обработчик кнопки управления сотрудниками"""
     # Проверяем права администратора
-    if not await is_admin(message.from_user.id):
+    if not is_admin:
         await message.answer("❌ Недостаточно прав")
         return
     
+    await discard_complaint_tasks(state)
     await state.clear()
     keyboard = Keyboards.employees_menu()
     await message.answer(Messages.EMPLOYEES_MENU.value, reply_markup=keyboard)
@@ -304,6 +359,8 @@ async def cancel_delete_employee(callback: CallbackQuery, state: FSMContext):
 
 async def start_complaint_process(message: Message, state: FSMContext):
     """Начало процесса подачи предложения"""
+    # Фото и голосовые прошлого незавершённого предложения больше не нужны
+    await discard_complaint_tasks(state)
     await state.set_state(ComplaintStates.choosing_category)
     
     keyboard = Keyboards.categories()
@@ -311,11 +368,11 @@ async def start_complaint_process(message: Message, state: FSMContext):
 
 
 @router.message(StateFilter(ComplaintStates.choosing_category))
-async def choose_category(message: Message, state: FSMContext):
+async def choose_category(message: Message, state: FSMContext, is_admin: bool, employee: Employee):
     """Выбор категории"""
     # Проверяем на кнопку "Назад"
     if message.text == ButtonTexts.BACK_TO_MAIN.value:
-        await back_to_main(message, state)
+        await back_to_main(message, state, is_admin, employee)
         return
     
     # Проверяем, что выбрана валидная категория
@@ -327,14 +384,9 @@ async def choose_category(message: Message, state: FSMContext):
     category = message.text
     await state.update_data(category=category)
 
-    user_id = message.from_user.id
-    
-
-    if await is_admin(user_id):
+    if is_admin:
         master_name = "Администратор"
     else:
-        employee = await db.get_employee_by_telegram_id(user_id)
-        
         if not employee:
             await message.answer(
                 "❌ Ошибка: вы не найдены в списке сотрудников. Обратитесь к администратору.",
@@ -346,6 +398,7 @@ async def choose_category(message: Message, state: FSMContext):
     await state.update_data(master=master_name)
     
     await state.set_state(ComplaintStates.uploading_photos)
+    await discard_complaint_tasks(state)
     await state.update_data(photos=[])
     
     text = (
@@ -368,54 +421,81 @@ async def skip_photos(message: Message, state: FSMContext):
     await message.answer(Messages.ENTER_COMMENT.value, reply_markup=Keyboards.comment_input())
 
 @router.message(F.text == ButtonTexts.CANCEL_COMPLAINT.value)
-async def cancel_complaint(message: Message, state: FSMContext):
+async def cancel_complaint(message: Message, state: FSMContext, is_admin: bool, employee: Employee):
     """Отмена подачи предложения"""
-    await back_to_main(message, state)
+    await back_to_main(message, state, is_admin, employee)
 
 
-@router.message(F.photo, StateFilter(ComplaintStates.uploading_photos))
-async def handle_photo(message: Message, state: FSMContext):
-    """Обработка загруженного фото"""
+@router.message(F.photo, StateFilter(ComplaintStates.uploading_photos), flags={'album': True})
+async def handle_photo(message: Message, state: FSMContext, employee: Employee, album: List[Message]):
+    """Обработка загруженного фото или альбома (см. AlbumMiddleware)"""
     data = await state.get_data()
     photos = data.get('photos', [])
     
-    if len(photos) >= 3:  # MAX_PHOTOS
-        await message.answer("❌ Максимум 3 фотографии")
+    free_slots = MAX_PHOTOS - len(photos)
+    if free_slots <= 0:
+        await message.answer(f"❌ Максимум {MAX_PHOTOS} фотографии")
         return
     
-    # Получаем информацию о фотографии (без загрузки в S3)
-    photo_info = await media_handler.get_photo_info(message.bot, message)
+    # Получаем информацию о фотографиях (без загрузки в S3) параллельно
+    accepted = album[:free_slots]
+    photo_infos = await asyncio.gather(
+        *(media_handler.get_photo_info(message.bot, photo_message) for photo_message in accepted)
+    )
     
-    if photo_info:
-        # Сохраняем информацию о фото для последующей загрузки в S3
-        photos.append(photo_info)
-        await state.update_data(photos=photos)
+    errors = []
+    if len(album) > free_slots:
+        errors.append(f"❌ Максимум {MAX_PHOTOS} фотографии, лишние фото не добавлены")
+    
+    employee_name = employee[1] if employee else "unknown"
+    for photo_info in photo_infos:
+        if photo_info is None:
+            errors.append("❌ Ошибка загрузки фото. Попробуйте ещё раз.")
+            continue
+        if photo_info['file_size'] and photo_info['file_size'] > MAX_PHOTO_SIZE:
+            errors.append(f"❌ Файл слишком большой. Максимальный размер: {MAX_PHOTO_SIZE // (1024 * 1024)} МБ")
+            continue
         
-        if len(photos) >= 3:
-            # Если загружено 3 фото - автоматически переходим к комментарию
-            text = f"✅ Фото {len(photos)}/3 загружено\n\nВсе фотографии загружены. Теперь добавьте комментарий:"
-            keyboard = Keyboards.photos_next()
-        else:
-            # Если меньше 3 фото - предлагаем загрузить еще или завершить
-            text = f"✅ Фото {len(photos)}/3 загружено\n\nЗагрузите ещё фото или перейдите к комментарию:"
-            keyboard = Keyboards.photos_with_finish()
-        
-        await message.answer(text, reply_markup=keyboard)
+        # Загрузка в S3 идёт в фоне, пока пользователь вводит комментарий
+        photo_info['upload_id'] = media_handler.start_photo_upload(photo_info, employee_name)
+        photos.append(photo_info)
         
         # Логируем информацию о фото
         logger.info(f"Фото получено: {photo_info['file_id']}, размер: {photo_info['width']}x{photo_info['height']}")
+    
+    added = len(photos) - (MAX_PHOTOS - free_slots)
+    if not added:
+        await message.answer("\n".join(errors))
+        return
+    
+    # Одно обновление состояния на весь альбом
+    media_handler.touch_photo_uploads(photos)
+    await state.update_data(photos=photos)
+    
+    if len(photos) >= MAX_PHOTOS:
+        # Если загружено 3 фото - автоматически переходим к комментарию
+        text = f"✅ Фото {len(photos)}/{MAX_PHOTOS} загружено\n\nВсе фотографии загружены. Теперь добавьте комментарий:"
+        keyboard = Keyboards.photos_next()
     else:
-        await message.answer("❌ Ошибка загрузки фото. Попробуйте ещё раз.")
+        # Если меньше 3 фото - предлагаем загрузить еще или завершить
+        text = f"✅ Фото {len(photos)}/{MAX_PHOTOS} загружено\n\nЗагрузите ещё фото или перейдите к комментарию:"
+        keyboard = Keyboards.photos_with_finish()
+    
+    if errors:
+        text = "\n".join(errors) + "\n\n" + text
+    await message.answer(text, reply_markup=keyboard)
 
 @router.message(F.text == ButtonTexts.NEXT_TO_COMMENT.value, StateFilter(ComplaintStates.uploading_photos))
 async def next_to_comment(message: Message, state: FSMContext):
     """Переход к комментарию после фото"""
+    await touch_complaint_uploads(state)
     await state.set_state(ComplaintStates.entering_comment)
     await message.answer(Messages.ENTER_COMMENT.value, reply_markup=Keyboards.comment_input())
 
 @router.message(F.text == ButtonTexts.FINISH_PHOTOS.value, StateFilter(ComplaintStates.uploading_photos))
 async def finish_photos(message: Message, state: FSMContext):
     """Завершение загрузки фото и переход к комментарию"""
+    await touch_complaint_uploads(state)
     await state.set_state(ComplaintStates.entering_comment)
     await message.answer(Messages.ENTER_COMMENT.value, reply_markup=Keyboards.comment_input())
 
@@ -424,11 +504,11 @@ async def finish_photos(message: Message, state: FSMContext):
 
 
 @router.message(F.text, StateFilter(ComplaintStates.entering_comment))
-async def handle_text_comment(message: Message, state: FSMContext):
+async def handle_text_comment(message: Message, state: FSMContext, is_admin: bool, employee: Employee):
     """Обработка текстового комментария"""
     # Проверяем на кнопку отмены
     if message.text == ButtonTexts.CANCEL_COMPLAINT.value:
-        await cancel_complaint(message, state)
+        await cancel_complaint(message, state, is_admin, employee)
         return
     
     await state.update_data(comment=message.text)
@@ -452,7 +532,14 @@ async def retry_comment_callback(callback: CallbackQuery, state: FSMContext):
 async def handle_voice_comment(message: Message, state: FSMContext):
     """Обработка голосового или аудио комментария"""
     # Показываем индикатор обработки
-    processing_msg = await message.answer("🎤 Анализируем аудио...")
+    processing_msg = await message.answer(Messages.TRANSCRIBING.value)
+    
+    async def show_progress(position: int, eta: float):
+        if position:
+            text = Messages.TRANSCRIPTION_QUEUED.value.format(position=position, eta=math.ceil(eta))
+        else:
+            text = Messages.TRANSCRIBING.value
+        await processing_msg.edit_text(text)
     
     try:
         if message.voice:
@@ -460,11 +547,16 @@ async def handle_voice_comment(message: Message, state: FSMContext):
         else:
             file = message.audio
 
-        comment = await media_handler.process_voice_message(message.bot, file)
+        # Распознавание идёт через общую очередь с ограниченным числом воркеров
+        comment = await transcription_queue.transcribe(state.key, message.bot, file, show_progress)
         
         # Удаляем сообщение об обработке
         await processing_msg.delete()
         
+        # Пока голосовое ждало, пользователь мог отправить текст
+        if await state.get_state() != ComplaintStates.entering_comment:
+            return
+        
         if comment:
             await state.update_data(comment=comment)
             await show_preview(message, state)
@@ -474,6 +566,13 @@ async def handle_voice_comment(message: Message, state: FSMContext):
                 "❌ Не удалось распознать речь. Попробуйте отправить текстовое сообщение или нажмите кнопку ниже для повтора.",
                 reply_markup=keyboard
             )
+    
+    except TranscriptionQueueFull:
+        await processing_msg.edit_text(Messages.TRANSCRIPTION_BUSY.value)
+    
+    except TranscriptionCancelled:
+        # Предложение отменено - ответ уже не нужен
+        await processing_msg.delete()
             
     except Exception as e:
         # Удаляем сообщение об обработке в случае ошибки
@@ -492,6 +591,7 @@ async def show_preview(message: Message, state: FSMContext):
     await state.set_state(ComplaintStates.preview)
     
     photos = data.get('photos', [])
+    media_handler.touch_photo_uploads(photos)
     if photos:
         photos_text = f"\n📷 Фотографий: {len(photos)}"
     else:
@@ -511,69 +611,44 @@ async def show_preview(message: Message, state: FSMContext):
 
 
 @router.message(F.text == ButtonTexts.SAVE.value, StateFilter(ComplaintStates.preview))
-async def save_complaint(message: Message, state: FSMContext):
+async def save_complaint(message: Message, state: FSMContext, employee: Employee):
     """Отправка предложения"""
     data = await state.get_data()
     
-    # Показываем индикатор загрузки
-    loading_msg = await message.answer("⏳ Обрабатываем предложение...")
+    # Статусное сообщение отредактирует фоновый обработчик
+    status_msg = await message.answer("⏳ Обрабатываем предложение...", reply_markup=Keyboards.send_another())
     
+    # Пока предложение ждёт в очереди, его загрузки не должны устареть
+    media_handler.touch_photo_uploads(data.get('photos', []))
     try:
-        # Получаем имя сотрудника
-        employee = await db.get_employee_by_telegram_id(message.from_user.id)
-        employee_name = employee[1] if employee else "unknown"
-        
-        # Загружаем фото в S3 (если есть)
-        photo_urls = []
-        photos_data = data.get('photos', [])
-        
-        if photos_data:
-            photo_urls = await media_handler.upload_photos_to_s3(
-                message.bot, 
-                photos_data, 
-                employee_name
-            )
-        
-        # Сохраняем в базу данных
-        db_success = await db.add_complaint(
-            employee_telegram_id=message.from_user.id,
-            category=data['category'],
-            master_name=data['master'],
-            comment=data['comment'],
-            photo_urls=photo_urls
-        )
-        
-        # Сохраняем в Google Sheets
-        sheets_success = await sheets_manager.add_complaint(
+        complaint_pipeline.submit(ComplaintJob(
+            bot=message.bot,
+            chat_id=message.chat.id,
+            status_message_id=status_msg.message_id,
+            telegram_id=message.from_user.id,
+            # Имя сотрудника для имени файла
+            employee_name=employee[1] if employee else "unknown",
             category=data['category'],
             master=data['master'],
             comment=data['comment'],
-            photo_urls=photo_urls
-        )
-        
-        # Удаляем сообщение с индикатором загрузки
-        await loading_msg.delete()
-        
-        if db_success and sheets_success:
-            text = Messages.COMPLAINT_SAVED.value
-        elif db_success:
-            text = "✅ Предложение сохранено в базу данных!\n⚠️ Ошибка отправки в Google Sheets."
-        else:
-            text = Messages.COMPLAINT_ERROR.value
-        
-        keyboard = Keyboards.send_another()
-        await message.answer(text, reply_markup=keyboard)
-        await state.clear()
-        
+            photos=list(data.get('photos', []))
+        ))
+    except ComplaintQueueFull:
+        # Предложение остаётся в предпросмотре - его можно отправить ещё раз
+        await status_msg.delete()
+        await message.answer(Messages.COMPLAINT_BUSY.value, reply_markup=Keyboards.preview())
+        return
     except Exception as e:
-        logger.error(f"Ошибка отправки предложения: {e}")
-        await loading_msg.delete()
-        await message.answer(Messages.COMPLAINT_ERROR.value, reply_markup=Keyboards.send_another())
-        await state.clear()
+        logger.error(f"Ошибка постановки предложения в очередь: {e}")
+        await status_msg.edit_text(Messages.COMPLAINT_ERROR.value)
+        await discard_complaint_tasks(state)
+    
+    await state.clear()
 
 @router.message(F.text == ButtonTexts.DELETE_AND_RESTART.value, StateFilter(ComplaintStates.preview))
 async def restart_complaint(message: Message, state: FSMContext):
     """Перезапуск процесса подачи предложения"""
+    await discard_complaint_tasks(state)
     await state.clear()
     await start_complaint_process(message, state)
 
@@ -594,11 +669,6 @@ async def handle_other_messages(message: Message, state: FSMContext):
     if message.chat.type != "private":
         return
     
-    # Проверяем доступ
-    if not await has_access(message.from_user.id):
-        await message.answer(Messages.ACCESS_DENIED.value)
-        return
-    
     # Отладочная информация
     current_state = await state.get_state()
     message_type = "unknown"
@@ -0,0 +1,157 @@
+"""
+Middleware для Telegram-бота
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.dispatcher.flags import get_flag
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from settings.config import TELEGRAM_ADMIN_ID, ALBUM_COLLECT_DELAY
+from settings.database import Database
+from utils.rate_limiter import RateLimiter
+from .enums import Messages
+
+logger = logging.getLogger(__name__)
+
+
+class AccessMiddleware(BaseMiddleware):
+    """
+    Проверка доступа один раз на обновление
+
+    Подключается как outer middleware роутера, поэтому срабатывает до
+    проверки фильтров. В данные обработчика добавляет:
+        is_admin: bool - пользователь является администратором
+        employee: Optional[Tuple[int, str]] - запись сотрудника (id, name)
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        if user is None:
+            return None
+
+        is_admin = int(user.id) == int(TELEGRAM_ADMIN_ID)
+        employee = None if is_admin else await self.db.get_employee_by_telegram_id(user.id)
+
+        if not is_admin and employee is None:
+            await self._reject(event)
+            return None
+
+        data['is_admin'] = is_admin
+        data['employee'] = employee
+        return await handler(event, data)
+
+    @staticmethod
+    async def _reject(event: TelegramObject):
+        """Ответ неавторизованному пользователю"""
+        if isinstance(event, Message):
+            # В группах молчим, как и обработчик прочих сообщений
+            if event.chat.type == "private":
+                await event.answer(Messages.ACCESS_DENIED.value)
+            logger.info(f"Доступ запрещён: пользователь={event.from_user.id}")
+        elif isinstance(event, CallbackQuery):
+            await event.answer(Messages.ACCESS_DENIED.value, show_alert=True)
+            logger.info(f"Доступ запрещён: пользователь={event.from_user.id}")
+
+
+class AlbumMiddleware(BaseMiddleware):
+    """
+    Сборка альбома (media group) в одно событие
+
+    Telegram присылает каждое фото альбома отдельным сообщением, и
+    обработчики выполняются параллельно. Middleware задерживает первое
+    сообщение группы, пока приходят остальные (окно продлевается с
+    каждым новым сообщением), и вызывает обработчик один раз. Остальные
+    сообщения группы обработчик не получают. В данные обработчика
+    добавляет:
+        album: List[Message] - сообщения альбома по порядку
+
+    Подключается как inner middleware, то есть после фильтров: в
+    альбом собираются только сообщения, которые принял бы обработчик.
+    Работает только для обработчиков с флагом album
+    (flags={'album': True}); остальные получают сообщения как есть.
+    """
+
+    def __init__(self, delay: float = ALBUM_COLLECT_DELAY):
+        self.delay = delay
+        self._albums: Dict[Tuple[int, str], List[Message]] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not get_flag(data, 'album'):
+            return await handler(event, data)
+
+        if not isinstance(event, Message) or not event.media_group_id:
+            data['album'] = [event]
+            return await handler(event, data)
+
+        key = (event.chat.id, event.media_group_id)
+        album = self._albums.get(key)
+        if album is not None:
+            album.append(event)
+            return None
+
+        album = self._albums[key] = [event]
+        try:
+            received = 0
+            while received != len(album):
+                received = len(album)
+                await asyncio.sleep(self.delay)
+        finally:
+            del self._albums[key]
+
+        data['album'] = sorted(album, key=lambda message: message.message_id)
+        return await handler(event, data)
+
+
+class RateLimitRequestMiddleware(BaseRequestMiddleware):
+    """
+    Ограничение частоты исходящих сообщений Telegram
+
+    Подключается к сессии бота, поэтому покрывает message.answer,
+    edit_text и прочие методы с chat_id. Методы без chat_id (getUpdates,
+    getFile) не ограничиваются. При TelegramRetryAfter чат
+    блокируется на указанное время и запрос повторяется.
+    """
+
+    def __init__(self, limiter: RateLimiter, max_retries: int = 2):
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType]
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        chat_destination = f"telegram_chat:{chat_id}"
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire('telegram', chat_destination)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.limiter.block(chat_destination, e.retry_after)
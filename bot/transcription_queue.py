@@ -0,0 +1,275 @@
+"""
+Очередь распознавания голосовых комментариев
+
+Голосовые обрабатываются ограниченным пулом воркеров: всплеск сообщений
+ждёт в очереди, а не запускает десятки ffmpeg и запросов распознавания
+одновременно. Если очередь заполнена, новое голосовое отклоняется, и
+пользователь может отправить комментарий текстом. Пока голосовое ждёт,
+пользователю показывается место в очереди и примерное время ожидания.
+Уже распознанные голосовые (повтор, пересылка) берутся из кэша без очереди.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Set
+
+from aiogram import Bot
+
+from settings.config import (
+    TRANSCRIPTION_WORKERS, TRANSCRIPTION_QUEUE_SIZE, TRANSCRIPTION_PROGRESS_INTERVAL
+)
+from utils.media_handler import MediaHandler
+from utils.transcript_cache import TranscriptCache
+
+logger = logging.getLogger(__name__)
+
+# Оценка длительности распознавания до первых замеров, секунды
+INITIAL_DURATION_ESTIMATE = 10.0
+# Вес последнего замера в скользящем среднем
+DURATION_SMOOTHING = 0.2
+
+ProgressCallback = Callable[[int, float], Awaitable[Any]]
+
+
+class TranscriptionQueueFull(Exception):
+    """Очередь распознавания заполнена"""
+
+
+class TranscriptionCancelled(Exception):
+    """Распознавание отменено вместе с предложением"""
+
+
+@dataclass(eq=False)
+class TranscriptionJob:
+    """Голосовое сообщение, ожидающее распознавания"""
+    owner: Hashable
+    bot: Bot
+    file: Any
+    on_progress: Optional[ProgressCallback] = None
+    future: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+    enqueued_at: float = field(default_factory=time.monotonic)
+    reported_position: int = 0
+    reported_at: float = 0.0
+    progress_task: Optional[asyncio.Task] = None
+
+
+class TranscriptionQueue:
+    """Очередь голосовых с ограниченным пулом воркеров"""
+
+    def __init__(
+        self,
+        media_handler: MediaHandler,
+        cache: Optional[TranscriptCache] = None,
+        workers: int = TRANSCRIPTION_WORKERS,
+        max_queue_size: int = TRANSCRIPTION_QUEUE_SIZE,
+        progress_interval: float = TRANSCRIPTION_PROGRESS_INTERVAL
+    ):
+        self.media_handler = media_handler
+        self.cache = cache
+        self.workers_count = max(1, workers)
+        self.max_queue_size = max(1, max_queue_size)
+        self.progress_interval = progress_interval
+        self.average_duration = INITIAL_DURATION_ESTIMATE
+        self.completed = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self._pending: Deque[TranscriptionJob] = deque()
+        self._running: Dict[TranscriptionJob, asyncio.Task] = {}
+        self._has_jobs: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+        self._progress_tasks: Set[asyncio.Task] = set()
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self):
+        """Запуск воркеров"""
+        if self.is_running:
+            return
+
+        self._has_jobs = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"transcription-worker-{i}")
+            for i in range(self.workers_count)
+        ]
+        logger.info(f"Очередь распознавания запущена, воркеров: {self.workers_count}")
+
+    async def stop(self):
+        """Остановка воркеров; ожидающие голосовые отменяются"""
+        if not self.is_running:
+            return
+
+        while self._pending:
+            self._resolve(self._pending.popleft(), error=TranscriptionCancelled())
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info("Очередь распознавания остановлена")
+
+    async def transcribe(
+        self,
+        owner: Hashable,
+        bot: Bot,
+        file: Any,
+        on_progress: Optional[ProgressCallback] = None
+    ) -> Optional[str]:
+        """
+        Распознавание голосового через очередь
+
+        Args:
+            owner: Владелец задания (ключ FSM); по нему задания отменяются
+            bot: Экземпляр бота для скачивания файла
+            file: Voice или Audio из сообщения
+            on_progress: Вызывается с местом в очереди и оценкой ожидания в секундах;
+                место 0 - распознавание началось
+
+        Returns:
+            Optional[str]: Текст или None, если речь не распознана
+
+        Raises:
+            TranscriptionQueueFull: Очередь заполнена
+            TranscriptionCancelled: Задание отменено через cancel()
+        """
+        if not self.is_running:
+            raise RuntimeError("Очередь распознавания не запущена")
+
+        cached = await self._cached(file)
+        if cached is not None:
+            return cached
+
+        if len(self._pending) - self._idle_workers() >= self.max_queue_size:
+            self.rejected += 1
+            raise TranscriptionQueueFull()
+
+        job = TranscriptionJob(owner, bot, file, on_progress)
+        self._pending.append(job)
+        self._has_jobs.set()
+        self._report_progress()
+        return await job.future
+
+    async def _cached(self, file: Any) -> Optional[str]:
+        file_unique_id = getattr(file, 'file_unique_id', None)
+        if self.cache is None or not file_unique_id:
+            return None
+        return await self.cache.get(file_unique_id, self.media_handler.speech_engine.version)
+
+    async def _store(self, file: Any, text: Optional[str]):
+        # Нераспознанное не кэшируется: повтор может пройти через запасной движок
+        file_unique_id = getattr(file, 'file_unique_id', None)
+        if self.cache is None or not file_unique_id or not text:
+            return
+        await self.cache.put(file_unique_id, self.media_handler.speech_engine.version, text)
+
+    def cancel(self, owner: Hashable):
+        """Отмена ожидающих и выполняющихся заданий владельца"""
+        for job in [job for job in self._pending if job.owner == owner]:
+            self._pending.remove(job)
+            self._resolve(job, error=TranscriptionCancelled())
+            self.cancelled += 1
+        for job, task in self._running.items():
+            if job.owner == owner:
+                task.cancel()
+        self._report_progress()
+
+    def stats(self) -> Dict[str, Any]:
+        """Глубина очереди и средняя длительность распознавания"""
+        return {
+            'queue_depth': len(self._pending),
+            'in_progress': len(self._running),
+            'workers': len(self._workers),
+            'average_duration': self.average_duration,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'cancelled': self.cancelled,
+            'cache': self.cache.stats() if self.cache else None
+        }
+
+    def estimate_wait(self, position: int) -> float:
+        """Оценка ожидания для места в очереди (1 - следующее)"""
+        return math.ceil(position / self.workers_count) * self.average_duration
+
+    def _idle_workers(self) -> int:
+        # Первые задания очереди сейчас заберут свободные воркеры - они не ждут
+        return max(0, self.workers_count - len(self._running))
+
+    def _report_progress(self):
+        """Обновление места в очереди у ожидающих (не чаще progress_interval)"""
+        now = time.monotonic()
+        idle_workers = self._idle_workers()
+        for index, job in enumerate(self._pending):
+            position = index - idle_workers + 1
+            if job.on_progress is None or position < 1 or position == job.reported_position:
+                continue
+            # Первое место сообщаем сразу, дальше - с ограничением частоты
+            if job.reported_position and now - job.reported_at < self.progress_interval:
+                continue
+
+            job.reported_position = position
+            job.reported_at = now
+            self._notify(job, position, self.estimate_wait(position))
+
+    def _notify(self, job: TranscriptionJob, position: int, eta: float):
+        previous = job.progress_task
+
+        async def notify():
+            # Обновления одного сообщения - строго по порядку
+            if previous is not None:
+                await asyncio.wait([previous])
+            try:
+                await job.on_progress(position, eta)
+            except Exception as e:
+                logger.warning(f"Не удалось обновить место в очереди распознавания: {e}")
+
+        task = job.progress_task = asyncio.create_task(notify())
+        self._progress_tasks.add(task)
+        task.add_done_callback(self._progress_tasks.discard)
+
+    @staticmethod
+    def _resolve(job: TranscriptionJob, result: Optional[str] = None, error: Optional[Exception] = None):
+        # Ожидающий обработчик мог быть отменён
+        if job.future.done():
+            return
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+    async def _worker(self, index: int):
+        while True:
+            while not self._pending:
+                self._has_jobs.clear()
+                await self._has_jobs.wait()
+
+            job = self._pending.popleft()
+            started = time.monotonic()
+            task = asyncio.create_task(self.media_handler.process_voice_message(job.bot, job.file))
+            self._running[job] = task
+            if job.reported_position:
+                self._notify(job, 0, 0.0)
+            self._report_progress()
+
+            try:
+                result = await asyncio.shield(task)
+            except asyncio.CancelledError:
+                self._resolve(job, error=TranscriptionCancelled())
+                if not task.cancelled():
+                    # Остановка воркера, а не отмена задания
+                    task.cancel()
+                    raise
+                self.cancelled += 1
+            except Exception as e:
+                logger.error(f"Воркер распознавания {index}: необработанная ошибка: {e}")
+                self._resolve(job, error=e)
+            else:
+                self._resolve(job, result)
+                self.completed += 1
+                duration = time.monotonic() - started
+                self.average_duration += DURATION_SMOOTHING * (duration - self.average_duration)
+                await self._store(job.file, result)
+            finally:
+                self._running.pop(job, None)
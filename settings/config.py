@@ -12,11 +12,25 @@ TELEGRAM_ADMIN_ID = int(os.getenv('TELEGRAM_ADMIN_ID', 0))
 
 # База данных
 DATABASE_PATH = os.getenv('DATABASE_PATH', 'bot_data.db')
+DB_READER_POOL_SIZE = int(os.getenv('DB_READER_POOL_SIZE', 4))     # Соединений только для чтения
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 128))  # Кэш подготовленных запросов
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', 5000))
+EMPLOYEE_CACHE_TTL = int(os.getenv('EMPLOYEE_CACHE_TTL', 0))  # Секунды, 0 - без периодического обновления
 
 # Google Sheets настройки
 GOOGLE_CREDENTIALS_FILE = os.getenv('GOOGLE_CREDENTIALS_FILE', 'credentials.json')
 SPREADSHEET_ID = os.getenv('SPREADSHEET_ID')
 WORKSHEET_NAME = os.getenv('WORKSHEET_NAME', 'Report')
+SHEETS_API_URL = os.getenv('SHEETS_API_URL', 'https://sheets.googleapis.com/v4')
+# Разбиение по периодам: формат strftime, добавляемый к WORKSHEET_NAME
+# (например, %Y-%m - отдельный лист на месяц). Пусто - один лист
+SHEETS_PARTITION_FORMAT = os.getenv('SHEETS_PARTITION_FORMAT', '')
+
+# Хранилище медиафайлов: s3 или local (каталог на диске)
+MEDIA_STORAGE = os.getenv('MEDIA_STORAGE', 's3')
+MEDIA_LOCAL_DIR = os.getenv('MEDIA_LOCAL_DIR', 'media')
+MEDIA_PUBLIC_URL = os.getenv('MEDIA_PUBLIC_URL', '')  # Адрес, по которому раздаётся MEDIA_LOCAL_DIR
+MEDIA_DEDUP = os.getenv('MEDIA_DEDUP', '1') == '1'  # Повторно присланные фото не сохраняются заново
 
 # S3 Storage настройки
 S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
@@ -24,13 +38,94 @@ S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME')
 S3_ACCESS_KEY = os.getenv('S3_ACCESS_KEY')
 S3_SECRET_KEY = os.getenv('S3_SECRET_KEY')
 S3_REGION = os.getenv('S3_REGION', 'us-east-1')
+S3_ACL = os.getenv('S3_ACL', 'public-read')          # Пусто - не передавать ACL
+S3_PUBLIC_URL = os.getenv('S3_PUBLIC_URL', '')      # По умолчанию S3_ENDPOINT_URL/S3_BUCKET_NAME
+S3_UPLOAD_CONCURRENCY = int(os.getenv('S3_UPLOAD_CONCURRENCY', 3))  # Одновременных загрузок фото
+PHOTO_UPLOAD_TTL = int(os.getenv('PHOTO_UPLOAD_TTL', 3600))  # Секунды; фоновые загрузки брошенных предложений удаляются
+S3_PART_SIZE = max(int(os.getenv('S3_PART_SIZE', 5 * 1024 * 1024)), 5 * 1024 * 1024)  # Часть multipart (минимум S3 - 5 МБ)
+S3_PART_CONCURRENCY = int(os.getenv('S3_PART_CONCURRENCY', 4))      # Одновременно загружаемых частей файла
+DOWNLOAD_CHUNK_SIZE = int(os.getenv('DOWNLOAD_CHUNK_SIZE', 64 * 1024))  # Чанк чтения из Telegram
+MAX_PHOTO_SIZE = int(os.getenv('MAX_PHOTO_SIZE', 20 * 1024 * 1024))      # Максимальный размер фото/документа
+
+# Пережатие фото перед сохранением (см. utils/images.py)
+IMAGE_PROCESSING = os.getenv('IMAGE_PROCESSING', '1') == '1'   # 0 - сохранять оригиналы как есть
+IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'webp')               # webp или jpeg
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', 2048))  # Большая сторона фото, px
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', 82))
+THUMBNAIL_SIZE = int(os.getenv('THUMBNAIL_SIZE', 320))         # Большая сторона миниатюры для таблицы, px
+
+# Общий HTTP-клиент (см. utils/http_client.py)
+HTTP_POOL_LIMIT = int(os.getenv('HTTP_POOL_LIMIT', 100))                 # Соединений всего
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', 10))  # Соединений к одному хосту
+HTTP_DNS_CACHE_TTL = int(os.getenv('HTTP_DNS_CACHE_TTL', 300))           # Секунды кэша DNS
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', 30))  # Секунды простоя keep-alive
+HTTP_REQUEST_TIMEOUT = float(os.getenv('HTTP_REQUEST_TIMEOUT', 120))     # Таймаут запроса целиком
+
+# Голосовые сообщения (см. utils/audio.py)
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+SPEECH_SAMPLE_RATE = int(os.getenv('SPEECH_SAMPLE_RATE', 16000))  # Частота PCM для распознавания, Гц
+SPEECH_SEGMENT_SECONDS = max(5.0, float(os.getenv('SPEECH_SEGMENT_SECONDS', 30)))  # Длинные записи режутся на фрагменты не длиннее (минимум 5 с)
+SPEECH_SILENCE_THRESHOLD_DB = float(os.getenv('SPEECH_SILENCE_THRESHOLD_DB', -35))  # Тише - пауза, дБ
+SPEECH_SILENCE_MIN_SECONDS = float(os.getenv('SPEECH_SILENCE_MIN_SECONDS', 0.4))    # Минимальная длительность паузы
+
+# Распознавание речи (см. utils/speech.py)
+SPEECH_ENGINE = os.getenv('SPEECH_ENGINE', 'google')                    # google или vosk (офлайн)
+SPEECH_FALLBACK_ENGINE = os.getenv('SPEECH_FALLBACK_ENGINE', 'google')  # Пусто - без запасного движка
+SPEECH_LANGUAGE = os.getenv('SPEECH_LANGUAGE', 'ru-RU')
+VOSK_MODEL_PATH = os.getenv('VOSK_MODEL_PATH', 'models/vosk-model-small-ru')
+VOSK_WORKERS = int(os.getenv('VOSK_WORKERS', min(2, os.cpu_count() or 1)))  # Процессов с загруженной моделью
+
+# Пулы для блокирующей работы (см. utils/executors.py)
+EXECUTOR_STORAGE_WORKERS = int(os.getenv('EXECUTOR_STORAGE_WORKERS', 4))  # Потоков для записи файлов на диск
+EXECUTOR_SPEECH_WORKERS = int(os.getenv('EXECUTOR_SPEECH_WORKERS', 4))  # Потоков для распознавания речи
+EXECUTOR_AUDIO_WORKERS = int(os.getenv('EXECUTOR_AUDIO_WORKERS', min(2, os.cpu_count() or 1)))  # Одновременных процессов ffmpeg
+EXECUTOR_IMAGE_WORKERS = int(os.getenv('EXECUTOR_IMAGE_WORKERS', min(2, os.cpu_count() or 1)))  # Процессов для пережатия фото
 
 # Настройки бота
 MAX_PHOTOS = 3
+ALBUM_COLLECT_DELAY = float(os.getenv('ALBUM_COLLECT_DELAY', 0.5))  # Секунды ожидания остальных фото альбома
+
+# Фоновая обработка предложений
+COMPLAINT_WORKERS = int(os.getenv('COMPLAINT_WORKERS', 4))         # Параллельных обработчиков
+COMPLAINT_QUEUE_SIZE = int(os.getenv('COMPLAINT_QUEUE_SIZE', 100))  # Максимум предложений в очереди
+COMPLAINT_SHUTDOWN_TIMEOUT = int(os.getenv('COMPLAINT_SHUTDOWN_TIMEOUT', 30))  # Секунды на дообработку при остановке
+
+# Очередь распознавания голосовых (см. bot/transcription_queue.py)
+TRANSCRIPTION_WORKERS = int(os.getenv('TRANSCRIPTION_WORKERS', 2))        # Одновременно распознаваемых голосовых
+TRANSCRIPTION_QUEUE_SIZE = int(os.getenv('TRANSCRIPTION_QUEUE_SIZE', 20))  # Максимум ожидающих, остальные отклоняются
+TRANSCRIPTION_PROGRESS_INTERVAL = float(os.getenv('TRANSCRIPTION_PROGRESS_INTERVAL', 3))  # Секунды между обновлениями места в очереди
+TRANSCRIPT_CACHE_SIZE = int(os.getenv('TRANSCRIPT_CACHE_SIZE', 1000))        # Распознанных текстов в памяти
+TRANSCRIPT_CACHE_DB_ROWS = int(os.getenv('TRANSCRIPT_CACHE_DB_ROWS', 50000))  # Записей в таблице transcripts
+
+# Метрики (очереди, кэши, лимиты): команда /stats администратора и журнал
+METRICS_LOG_INTERVAL = float(os.getenv('METRICS_LOG_INTERVAL', 300))  # Секунды между записями в журнал, 0 - отключить
+
+# Пакетная запись в Google Sheets
+SHEETS_BATCH_SIZE = int(os.getenv('SHEETS_BATCH_SIZE', 50))              # Строк в одной записи
+SHEETS_FLUSH_INTERVAL = float(os.getenv('SHEETS_FLUSH_INTERVAL', 1.0))   # Секунды ожидания попутных строк
+
+# Синхронизация очереди sheets_outbox
+SHEETS_SYNC_INTERVAL = float(os.getenv('SHEETS_SYNC_INTERVAL', 30))         # Опрос очереди, секунды
+SHEETS_RETRY_BASE_DELAY = float(os.getenv('SHEETS_RETRY_BASE_DELAY', 5))    # Первая пауза после ошибки
+SHEETS_RETRY_MAX_DELAY = float(os.getenv('SHEETS_RETRY_MAX_DELAY', 900))    # Максимальная пауза
+
+# Сверка жалоб из базы с Google Sheets
+SHEETS_RECONCILE_INTERVAL = float(os.getenv('SHEETS_RECONCILE_INTERVAL', 3600))  # Секунды, 0 - отключить
+SHEETS_RECONCILE_PAGE = int(os.getenv('SHEETS_RECONCILE_PAGE', 5000))            # Жалоб за один проход
+SHEETS_BACKFILL_CHUNK = int(os.getenv('SHEETS_BACKFILL_CHUNK', 1000))            # Строк в одной записи дозаливки
+
+# Ограничение частоты запросов
+SHEETS_READ_RATE_PER_MINUTE = int(os.getenv('SHEETS_READ_RATE_PER_MINUTE', 60))
+SHEETS_WRITE_RATE_PER_MINUTE = int(os.getenv('SHEETS_WRITE_RATE_PER_MINUTE', 60))
+SHEETS_MAX_RETRIES = int(os.getenv('SHEETS_MAX_RETRIES', 3))        # Повторов после 429
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', 30))  # Сообщений в секунду всего
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', 1))      # Сообщений в секунду в один чат
+TELEGRAM_CHAT_BURST = float(os.getenv('TELEGRAM_CHAT_BURST', 3))    # Допустимый всплеск в один чат
 
 # Google Sheets структура
 SHEETS_START_ROW = 1
 SHEETS_COLUMNS = {
+    'ID': 'A',          # ID жалобы в базе
     'DATE': 'B',        # Дата
     'TIME': 'C',        # Время
     'CATEGORY': 'D',    # Категория
@@ -52,5 +147,5 @@ if not SPREADSHEET_ID:
     raise ValueError("SPREADSHEET_ID не найден в переменных окружения")
 
 # Проверка S3 переменных
-if not all([S3_ENDPOINT_URL, S3_BUCKET_NAME, S3_ACCESS_KEY, S3_SECRET_KEY]):
+if MEDIA_STORAGE == 's3' and not all([S3_ENDPOINT_URL, S3_BUCKET_NAME, S3_ACCESS_KEY, S3_SECRET_KEY]):
     raise ValueError("Не все S3 переменные настроены в .env файле")
\ No newline at end of file
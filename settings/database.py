@@ -1,27 +1,161 @@
 """
 Модуль для работы с базой данных SQLite
 """
+import asyncio
+import json
 import sqlite3
+import time
 import aiosqlite
 import logging
-from typing import List, Optional, Tuple
-from datetime import datetime
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
 
-from .config import TELEGRAM_ADMIN_ID
+from .config import (
+    TELEGRAM_ADMIN_ID, DB_READER_POOL_SIZE, DB_STATEMENT_CACHE_SIZE,
+    DB_BUSY_TIMEOUT_MS, EMPLOYEE_CACHE_TTL
+)
 
 logger = logging.getLogger(__name__)
 
+# Настройки, применяемые к каждому соединению пула
+CONNECTION_PRAGMAS = (
+    f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -8000",
+    "PRAGMA mmap_size = 67108864",
+)
+
+
+class EmployeeDirectory:
+    """Справочник активных сотрудников в памяти процесса
+    
+    Ключ - Telegram ID, значение - (id, name), как у get_employee_by_telegram_id.
+    Изменяется только из Database после успешного commit.
+    """
+    
+    def __init__(self, ttl: int = EMPLOYEE_CACHE_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.loaded_at: Optional[float] = None
+        self._by_telegram_id: Dict[int, Tuple[int, str]] = {}
+        self._telegram_ids: Dict[int, int] = {}
+    
+    @property
+    def is_loaded(self) -> bool:
+        return self.loaded_at is not None
+    
+    def is_stale(self) -> bool:
+        """Нужна ли перезагрузка справочника из базы"""
+        if not self.is_loaded:
+            return True
+        return self.ttl > 0 and time.monotonic() - self.loaded_at >= self.ttl
+    
+    def load(self, employees: List[Tuple[int, int, str]]):
+        """Полная замена содержимого списком (id, telegram_id, name)"""
+        self._by_telegram_id = {telegram_id: (emp_id, name) for emp_id, telegram_id, name in employees}
+        self._telegram_ids = {emp_id: telegram_id for emp_id, telegram_id, _ in employees}
+        self.loaded_at = time.monotonic()
+    
+    def get(self, telegram_id: int) -> Optional[Tuple[int, str]]:
+        employee = self._by_telegram_id.get(int(telegram_id))
+        if employee is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return employee
+    
+    def put(self, employee_id: int, telegram_id: int, name: str):
+        self._by_telegram_id[telegram_id] = (employee_id, name)
+        self._telegram_ids[employee_id] = telegram_id
+    
+    def remove(self, employee_id: int):
+        telegram_id = self._telegram_ids.pop(employee_id, None)
+        if telegram_id is not None:
+            self._by_telegram_id.pop(telegram_id, None)
+    
+    def stats(self) -> Dict[str, float]:
+        """Счётчики попаданий и промахов"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._by_telegram_id),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
 
 class Database:
-    """Класс для работы с базой данных"""
+    """Класс для работы с базой данных
+    
+    Держит пул долгоживущих соединений: одно соединение для записи
+    (сериализуется через asyncio.Lock) и несколько соединений только
+    для чтения. Пул открывается в initialize() и закрывается в close().
+    """
     
-    def __init__(self, db_path: str = "bot_data.db"):
+    def __init__(self, db_path: str = "bot_data.db", pool_size: int = DB_READER_POOL_SIZE):
         self.db_path = db_path
+        self.pool_size = max(1, pool_size)
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle_readers: Optional[asyncio.Queue] = None
+        self._write_lock = asyncio.Lock()
+        self.employees = EmployeeDirectory()
+    
+    async def _open_connection(self, read_only: bool = False) -> aiosqlite.Connection:
+        """Открытие соединения с настройками пула"""
+        # cached_statements - размер кэша подготовленных выражений sqlite3,
+        # повторные запросы на долгоживущем соединении не компилируются заново
+        connection = await aiosqlite.connect(
+            self.db_path,
+            cached_statements=DB_STATEMENT_CACHE_SIZE
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            await connection.execute(pragma)
+        if read_only:
+            await connection.execute("PRAGMA query_only = ON")
+        return connection
+    
+    @asynccontextmanager
+    async def _read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Соединение для чтения из пула"""
+        if self._idle_readers is None:
+            raise RuntimeError("Пул соединений базы данных не инициализирован")
+        
+        connection = await self._idle_readers.get()
+        try:
+            yield connection
+        finally:
+            self._idle_readers.put_nowait(connection)
+    
+    @asynccontextmanager
+    async def _write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Эксклюзивный доступ к соединению для записи"""
+        if self._writer is None:
+            raise RuntimeError("Пул соединений базы данных не инициализирован")
+        
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except Exception:
+                await self._writer.rollback()
+                raise
     
     async def initialize(self):
-        """Инициализация базы данных"""
+        """Инициализация базы данных и пула соединений"""
+        if self._writer is not None:
+            return
+        
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            self._writer = await self._open_connection()
+            
+            # WAL позволяет читателям работать параллельно с записью
+            async with self._writer.execute("PRAGMA journal_mode = WAL") as cursor:
+                mode = await cursor.fetchone()
+            
+            async with self._write() as db:
                 # Таблица сотрудников
                 await db.execute("""
                     CREATE TABLE IF NOT EXISTS employees (
@@ -42,18 +176,142 @@ class Database:
                         master_name TEXT NOT NULL,
                         comment TEXT NOT NULL,
                         photo_urls TEXT,
+                        thumbnail_urls TEXT,
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                         FOREIGN KEY (employee_id) REFERENCES employees (id)
                     )
                 """)
                 
+                # Миниатюры фото появились позже - дополняем старые базы
+                async with db.execute("PRAGMA table_info(complaints)") as cursor:
+                    columns = {row[1] for row in await cursor.fetchall()}
+                if 'thumbnail_urls' not in columns:
+                    await db.execute("ALTER TABLE complaints ADD COLUMN thumbnail_urls TEXT")
+                
+                # Очередь синхронизации жалоб с Google Sheets
+                await db.execute("""
+                    CREATE TABLE IF NOT EXISTS sheets_outbox (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        complaint_id INTEGER NOT NULL,
+                        payload TEXT NOT NULL,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        next_attempt_at REAL NOT NULL DEFAULT 0,
+                        last_error TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        synced_at TIMESTAMP,
+                        FOREIGN KEY (complaint_id) REFERENCES complaints (id)
+                    )
+                """)
+                await db.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_sheets_outbox_pending
+                    ON sheets_outbox (next_attempt_at) WHERE synced_at IS NULL
+                """)
+                
+                # Сохранённые медиафайлы по хешу содержимого (дедупликация)
+                await db.execute("""
+                    CREATE TABLE IF NOT EXISTS media_files (
+                        content_hash TEXT PRIMARY KEY,
+                        url TEXT NOT NULL,
+                        thumbnail_url TEXT,
+                        size INTEGER,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                
+                # Telegram file_unique_id -> хеш содержимого
+                await db.execute("""
+                    CREATE TABLE IF NOT EXISTS media_file_ids (
+                        file_unique_id TEXT PRIMARY KEY,
+                        content_hash TEXT NOT NULL,
+                        FOREIGN KEY (content_hash) REFERENCES media_files (content_hash)
+                    )
+                """)
+                
+                # Распознанные голосовые: ключ - file_unique_id и версия движка
+                await db.execute("""
+                    CREATE TABLE IF NOT EXISTS transcripts (
+                        file_unique_id TEXT NOT NULL,
+                        engine_version TEXT NOT NULL,
+                        text TEXT NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (file_unique_id, engine_version)
+                    )
+                """)
+                await db.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_transcripts_used_at ON transcripts (used_at)"
+                )
+                
+                # Служебные значения синхронизации (например, отметка сверки)
+                await db.execute("""
+                    CREATE TABLE IF NOT EXISTS sync_state (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                
                 await db.commit()
-                logger.info("База данных успешно инициализирована")
+            
+            self._readers = [
+                await self._open_connection(read_only=True)
+                for _ in range(self.pool_size)
+            ]
+            self._idle_readers = asyncio.Queue()
+            for connection in self._readers:
+                self._idle_readers.put_nowait(connection)
+            
+            await self.refresh_employees()
+            
+            logger.info(
+                f"База данных успешно инициализирована "
+                f"(journal_mode={mode[0] if mode else 'unknown'}, читателей: {self.pool_size})"
+            )
                 
         except Exception as e:
             logger.error(f"Ошибка инициализации базы данных: {e}")
+            await self.close()
             raise
     
+    async def close(self):
+        """Закрытие всех соединений пула"""
+        connections = list(self._readers)
+        if self._writer is not None:
+            connections.append(self._writer)
+        
+        self._readers = []
+        self._idle_readers = None
+        self._writer = None
+        
+        for connection in connections:
+            try:
+                await connection.close()
+            except Exception as e:
+                logger.warning(f"Ошибка закрытия соединения с базой данных: {e}")
+        
+        if connections:
+            logger.info("Соединения с базой данных закрыты")
+    
+    async def refresh_employees(self, force: bool = True):
+        """
+        Перезагрузка справочника сотрудников из базы данных
+        
+        Args:
+            force: Перезагрузить, даже если справочник ещё не устарел
+        """
+        # Под блокировкой записи, чтобы не затереть параллельное изменение
+        async with self._write() as db:
+            if not force and not self.employees.is_stale():
+                return
+            
+            async with db.execute(
+                "SELECT id, telegram_id, name FROM employees WHERE is_active = 1"
+            ) as cursor:
+                employees = await cursor.fetchall()
+            self.employees.load(employees)
+        
+        logger.info(f"Справочник сотрудников загружен: {len(employees)}")
+    
     async def add_employee(self, telegram_id: int, name: str) -> bool:
         """
         Добавление нового сотрудника или реактивация существующего
@@ -66,13 +324,13 @@ class Database:
             bool: Успешность операции
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self._write() as db:
                 # Проверяем, существует ли уже сотрудник (включая неактивных)
-                cursor = await db.execute(
+                async with db.execute(
                     "SELECT id, is_active FROM employees WHERE telegram_id = ?",
                     (telegram_id,)
-                )
-                existing = await cursor.fetchone()
+                ) as cursor:
+                    existing = await cursor.fetchone()
                 
                 if existing:
                     # Если сотрудник существует, но неактивен - реактивируем
@@ -82,6 +340,7 @@ class Database:
                             (name, telegram_id)
                         )
                         await db.commit()
+                        self.employees.put(existing[0], telegram_id, name)
                         logger.info(f"Сотрудник реактивирован: {name} (ID: {telegram_id})")
                         return True
                     else:
@@ -89,11 +348,12 @@ class Database:
                         return False
                 else:
                     # Добавляем нового сотрудника
-                    await db.execute(
+                    cursor = await db.execute(
                         "INSERT INTO employees (telegram_id, name) VALUES (?, ?)",
                         (telegram_id, name)
                     )
                     await db.commit()
+                    self.employees.put(cursor.lastrowid, telegram_id, name)
                     logger.info(f"Сотрудник добавлен: {name} (ID: {telegram_id})")
                     return True
                 
@@ -109,11 +369,11 @@ class Database:
             List[Tuple[int, int, str]]: Список (id, telegram_id, name)
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                cursor = await db.execute(
+            async with self._read() as db:
+                async with db.execute(
                     "SELECT id, telegram_id, name FROM employees WHERE is_active = 1 ORDER BY name"
-                )
-                employees = await cursor.fetchall()
+                ) as cursor:
+                    employees = await cursor.fetchall()
                 return employees
                 
         except Exception as e:
@@ -131,13 +391,10 @@ class Database:
             Optional[Tuple[int, str]]: (id, name) или None
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                cursor = await db.execute(
-                    "SELECT id, name FROM employees WHERE telegram_id = ? AND is_active = 1",
-                    (telegram_id,)
-                )
-                result = await cursor.fetchone()
-                return result
+            if self.employees.is_stale():
+                await self.refresh_employees(force=False)
+            
+            return self.employees.get(telegram_id)
                 
         except Exception as e:
             logger.error(f"Ошибка поиска сотрудника: {e}")
@@ -154,12 +411,13 @@ class Database:
             bool: Успешность операции
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self._write() as db:
                 cursor = await db.execute(
                     "UPDATE employees SET is_active = 0 WHERE id = ?",
                     (employee_id,)
                 )
                 await db.commit()
+                self.employees.remove(employee_id)
                 
                 if cursor.rowcount > 0:
                     logger.info(f"Сотрудник с ID {employee_id} деактивирован")
@@ -183,8 +441,12 @@ class Database:
             bool: Успешность операции
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                # Сначала удаляем связанные жалобы
+            async with self._write() as db:
+                # Сначала удаляем связанные жалобы и их очередь синхронизации
+                await db.execute(
+                    "DELETE FROM sheets_outbox WHERE complaint_id IN (SELECT id FROM complaints WHERE employee_id = ?)",
+                    (employee_id,)
+                )
                 await db.execute(
                     "DELETE FROM complaints WHERE employee_id = ?",
                     (employee_id,)
@@ -196,6 +458,7 @@ class Database:
                     (employee_id,)
                 )
                 await db.commit()
+                self.employees.remove(employee_id)
                 
                 if cursor.rowcount > 0:
                     logger.info(f"Сотрудник с ID {employee_id} полностью удален")
@@ -227,17 +490,22 @@ class Database:
         category: str,
         master_name: str,
         comment: str,
-        photo_urls: List[str] = None
+        photo_urls: List[str] = None,
+        thumbnail_urls: List[str] = None
     ) -> bool:
         """
         Добавление жалобы в базу данных
         
+        В той же транзакции жалоба ставится в очередь sheets_outbox
+        для синхронизации с Google Sheets.
+        
         Args:
             employee_telegram_id: Telegram ID сотрудника
             category: Категория жалобы
             master_name: Имя мастера
             comment: Комментарий
             photo_urls: Список URL фотографий
+            thumbnail_urls: URL миниатюр в том же порядке (пустая строка - нет миниатюры)
             
         Returns:
             bool: Успешность операции
@@ -258,13 +526,27 @@ class Database:
             
             # Преобразуем список URL в строку
             photo_urls_str = ",".join(photo_urls) if photo_urls else ""
+            thumbnail_urls_str = ",".join(thumbnail_urls) if thumbnail_urls else ""
             
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute(
+            payload = json.dumps({
+                'category': category,
+                'master': master_name,
+                'comment': comment,
+                'photo_urls': photo_urls or [],
+                'thumbnail_urls': thumbnail_urls or [],
+                'created_at': datetime.now(timezone.utc).isoformat()
+            }, ensure_ascii=False)
+            
+            async with self._write() as db:
+                cursor = await db.execute(
                     """INSERT INTO complaints 
-                       (employee_id, category, master_name, comment, photo_urls) 
-                       VALUES (?, ?, ?, ?, ?)""",
-                    (employee_id, category, master_name, comment, photo_urls_str)
+                       (employee_id, category, master_name, comment, photo_urls, thumbnail_urls) 
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    (employee_id, category, master_name, comment, photo_urls_str, thumbnail_urls_str)
+                )
+                await db.execute(
+                    "INSERT INTO sheets_outbox (complaint_id, payload) VALUES (?, ?)",
+                    (cursor.lastrowid, payload)
                 )
                 await db.commit()
                 
@@ -283,11 +565,389 @@ class Database:
             int: Количество жалоб
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                cursor = await db.execute("SELECT COUNT(*) FROM complaints")
-                result = await cursor.fetchone()
+            async with self._read() as db:
+                async with db.execute("SELECT COUNT(*) FROM complaints") as cursor:
+                    result = await cursor.fetchone()
                 return result[0] if result else 0
                 
         except Exception as e:
             logger.error(f"Ошибка получения количества жалоб: {e}")
-            return 0
\ No newline at end of file
+            return 0
+    
+    async def get_pending_sheets_rows(self, limit: int) -> List[Tuple[int, int, dict, int]]:
+        """
+        Получение жалоб, ожидающих синхронизации с Google Sheets
+        
+        Args:
+            limit: Максимальное количество записей
+            
+        Returns:
+            List[Tuple[int, int, dict, int]]: Список (id, complaint_id, payload, attempts)
+        """
+        try:
+            async with self._read() as db:
+                async with db.execute(
+                    """SELECT id, complaint_id, payload, attempts FROM sheets_outbox
+                       WHERE synced_at IS NULL AND next_attempt_at <= ?
+                       ORDER BY id LIMIT ?""",
+                    (time.time(), limit)
+                ) as cursor:
+                    rows = await cursor.fetchall()
+                return [(row_id, complaint_id, json.loads(payload), attempts)
+                        for row_id, complaint_id, payload, attempts in rows]
+                
+        except Exception as e:
+            logger.error(f"Ошибка получения очереди Google Sheets: {e}")
+            return []
+    
+    async def mark_sheets_synced(self, outbox_ids: List[int]) -> bool:
+        """
+        Отметка записей очереди как синхронизированных
+        
+        Args:
+            outbox_ids: ID записей sheets_outbox
+            
+        Returns:
+            bool: Успешность операции
+        """
+        if not outbox_ids:
+            return True
+        
+        try:
+            async with self._write() as db:
+                await db.executemany(
+                    "UPDATE sheets_outbox SET synced_at = CURRENT_TIMESTAMP, last_error = NULL WHERE id = ?",
+                    [(outbox_id,) for outbox_id in outbox_ids]
+                )
+                await db.commit()
+                return True
+                
+        except Exception as e:
+            logger.error(f"Ошибка отметки синхронизации: {e}")
+            return False
+    
+    async def mark_sheets_failed(self, outbox_id: int, attempts: int, next_attempt_at: float, error: str) -> bool:
+        """
+        Отметка неудачной попытки синхронизации
+        
+        Args:
+            outbox_id: ID записи sheets_outbox
+            attempts: Количество попыток с учётом текущей
+            next_attempt_at: Время следующей попытки (unix time)
+            error: Текст ошибки
+            
+        Returns:
+            bool: Успешность операции
+        """
+        try:
+            async with self._write() as db:
+                await db.execute(
+                    "UPDATE sheets_outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                    (attempts, next_attempt_at, error, outbox_id)
+                )
+                await db.commit()
+                return True
+                
+        except Exception as e:
+            logger.error(f"Ошибка отметки неудачной синхронизации: {e}")
+            return False
+    
+    async def get_sheets_backlog(self) -> int:
+        """
+        Количество жалоб, ещё не синхронизированных с Google Sheets
+        
+        Returns:
+            int: Размер очереди
+        """
+        try:
+            async with self._read() as db:
+                async with db.execute("SELECT COUNT(*) FROM sheets_outbox WHERE synced_at IS NULL") as cursor:
+                    result = await cursor.fetchone()
+                return result[0] if result else 0
+                
+        except Exception as e:
+            logger.error(f"Ошибка получения размера очереди Google Sheets: {e}")
+            return 0
+    
+    async def get_last_complaint_id(self) -> int:
+        """
+        Получение ID последней жалобы
+        
+        Returns:
+            int: ID или 0, если жалоб нет
+        """
+        try:
+            async with self._read() as db:
+                async with db.execute("SELECT MAX(id) FROM complaints") as cursor:
+                    result = await cursor.fetchone()
+                return (result[0] or 0) if result else 0
+                
+        except Exception as e:
+            logger.error(f"Ошибка получения последней жалобы: {e}")
+            raise
+    
+    async def get_complaints_after(
+        self, after_id: int, limit: int
+    ) -> List[Tuple[int, str, str, str, List[str], List[str], datetime]]:
+        """
+        Получение жалоб с ID больше заданного
+        
+        Args:
+            after_id: ID, после которого начинается выборка
+            limit: Максимальное количество записей
+            
+        Returns:
+            List[Tuple[int, str, str, str, List[str], List[str], datetime]]:
+                Список (id, category, master_name, comment, photo_urls, thumbnail_urls, created_at в UTC)
+        """
+        try:
+            async with self._read() as db:
+                async with db.execute(
+                    """SELECT id, category, master_name, comment, photo_urls, thumbnail_urls, created_at
+                       FROM complaints WHERE id > ? ORDER BY id LIMIT ?""",
+                    (after_id, limit)
+                ) as cursor:
+                    rows = await cursor.fetchall()
+                return [
+                    (complaint_id, category, master_name, comment,
+                     photo_urls.split(",") if photo_urls else [],
+                     thumbnail_urls.split(",") if thumbnail_urls else [],
+                     datetime.fromisoformat(created_at).replace(tzinfo=timezone.utc))
+                    for complaint_id, category, master_name, comment, photo_urls, thumbnail_urls, created_at in rows
+                ]
+                
+        except Exception as e:
+            logger.error(f"Ошибка получения жалоб: {e}")
+            return []
+    
+    async def get_unsynced_complaint_ids(self, min_id: int, max_id: int) -> List[int]:
+        """
+        ID жалоб из диапазона, ещё ожидающих записи через sheets_outbox
+        
+        Args:
+            min_id: Нижняя граница ID жалобы (включительно)
+            max_id: Верхняя граница ID жалобы (включительно)
+            
+        Returns:
+            List[int]: ID жалоб по возрастанию
+        """
+        try:
+            async with self._read() as db:
+                async with db.execute(
+                    """SELECT DISTINCT complaint_id FROM sheets_outbox
+                       WHERE synced_at IS NULL AND complaint_id BETWEEN ? AND ?
+                       ORDER BY complaint_id""",
+                    (min_id, max_id)
+                ) as cursor:
+                    rows = await cursor.fetchall()
+                return [row[0] for row in rows]
+                
+        except Exception as e:
+            logger.error(f"Ошибка получения очереди Google Sheets: {e}")
+            raise
+    
+    async def get_sync_state(self, key: str) -> Optional[str]:
+        """
+        Получение служебного значения синхронизации
+        
+        Args:
+            key: Ключ значения
+            
+        Returns:
+            Optional[str]: Значение или None
+        """
+        async with self._read() as db:
+            async with db.execute("SELECT value FROM sync_state WHERE key = ?", (key,)) as cursor:
+                result = await cursor.fetchone()
+            return result[0] if result else None
+    
+    async def set_sync_state(self, key: str, value: str) -> bool:
+        """
+        Сохранение служебного значения синхронизации
+        
+        Args:
+            key: Ключ значения
+            value: Значение
+            
+        Returns:
+            bool: Успешность операции
+        """
+        try:
+            async with self._write() as db:
+                await db.execute(
+                    """INSERT INTO sync_state (key, value) VALUES (?, ?)
+                       ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = CURRENT_TIMESTAMP""",
+                    (key, value)
+                )
+                await db.commit()
+                return True
+                
+        except Exception as e:
+            logger.error(f"Ошибка сохранения состояния синхронизации: {e}")
+            return False
+    
+    async def get_transcript(self, file_unique_id: str, engine_version: str) -> Optional[str]:
+        """
+        Получение сохранённого текста голосового
+        
+        Args:
+            file_unique_id: Telegram file_unique_id
+            engine_version: Версия движка распознавания
+            
+        Returns:
+            Optional[str]: Текст или None
+        """
+        try:
+            async with self._read() as db:
+                async with db.execute(
+                    "SELECT text FROM transcripts WHERE file_unique_id = ? AND engine_version = ?",
+                    (file_unique_id, engine_version)
+                ) as cursor:
+                    result = await cursor.fetchone()
+                return result[0] if result else None
+                
+        except Exception as e:
+            logger.error(f"Ошибка получения распознанного текста: {e}")
+            return None
+    
+    async def save_transcript(self, file_unique_id: str, engine_version: str, text: str, max_rows: int) -> int:
+        """
+        Сохранение текста голосового (для существующей записи обновляется used_at)
+        
+        Вытеснение проверяется только при добавлении новой записи: если
+        записей больше max_rows, удаляются давно не использованные.
+        
+        Args:
+            file_unique_id: Telegram file_unique_id
+            engine_version: Версия движка распознавания
+            text: Распознанный текст
+            max_rows: Максимум записей в таблице
+            
+        Returns:
+            int: Количество удалённых записей
+        """
+        try:
+            async with self._write() as db:
+                cursor = await db.execute(
+                    """UPDATE transcripts SET text = ?, used_at = CURRENT_TIMESTAMP
+                       WHERE file_unique_id = ? AND engine_version = ?""",
+                    (text, file_unique_id, engine_version)
+                )
+                if cursor.rowcount:
+                    await db.commit()
+                    return 0
+                
+                await db.execute(
+                    "INSERT INTO transcripts (file_unique_id, engine_version, text) VALUES (?, ?, ?)",
+                    (file_unique_id, engine_version, text)
+                )
+                
+                evicted = 0
+                async with db.execute("SELECT 1 FROM transcripts LIMIT 1 OFFSET ?", (max_rows,)) as overflow:
+                    if await overflow.fetchone():
+                        cursor = await db.execute(
+                            """DELETE FROM transcripts WHERE rowid IN (
+                                   SELECT rowid FROM transcripts ORDER BY used_at DESC, rowid DESC LIMIT -1 OFFSET ?
+                               )""",
+                            (max_rows,)
+                        )
+                        evicted = cursor.rowcount
+                await db.commit()
+                return evicted
+                
+        except Exception as e:
+            logger.error(f"Ошибка сохранения распознанного текста: {e}")
+            return 0
+    
+    async def touch_transcript(self, file_unique_id: str, engine_version: str) -> bool:
+        """
+        Обновление used_at записи, взятой из кэша
+        
+        Args:
+            file_unique_id: Telegram file_unique_id
+            engine_version: Версия движка распознавания
+            
+        Returns:
+            bool: Успешность операции
+        """
+        try:
+            async with self._write() as db:
+                await db.execute(
+                    """UPDATE transcripts SET used_at = CURRENT_TIMESTAMP
+                       WHERE file_unique_id = ? AND engine_version = ?""",
+                    (file_unique_id, engine_version)
+                )
+                await db.commit()
+                return True
+                
+        except Exception as e:
+            logger.error(f"Ошибка обновления распознанного текста: {e}")
+            return False
+    
+    async def find_media(
+        self,
+        content_hash: Optional[str] = None,
+        file_unique_id: Optional[str] = None
+    ) -> Optional[Tuple[str, str, Optional[str]]]:
+        """
+        Поиск уже сохранённого медиафайла
+        
+        Args:
+            content_hash: SHA-256 содержимого
+            file_unique_id: Telegram file_unique_id (проверяется, если хеш не задан)
+            
+        Returns:
+            Optional[Tuple[str, str, Optional[str]]]: (content_hash, url, thumbnail_url) или None
+        """
+        try:
+            async with self._read() as db:
+                if content_hash is not None:
+                    query = "SELECT content_hash, url, thumbnail_url FROM media_files WHERE content_hash = ?"
+                    args = (content_hash,)
+                else:
+                    query = """SELECT f.content_hash, f.url, f.thumbnail_url FROM media_file_ids i
+                               JOIN media_files f ON f.content_hash = i.content_hash
+                               WHERE i.file_unique_id = ?"""
+                    args = (file_unique_id,)
+                
+                async with db.execute(query, args) as cursor:
+                    return await cursor.fetchone()
+                
+        except Exception as e:
+            logger.error(f"Ошибка поиска медиафайла: {e}")
+            return None
+    
+    async def register_media(self, files: List[Tuple[str, Optional[str], str, Optional[str], int]]) -> bool:
+        """
+        Регистрация сохранённых медиафайлов для повторного использования
+        
+        Уже известный хеш не перезаписывается - остаётся первая ссылка.
+        
+        Args:
+            files: Список (content_hash, file_unique_id, url, thumbnail_url, size)
+            
+        Returns:
+            bool: Успешность операции
+        """
+        if not files:
+            return True
+        
+        try:
+            async with self._write() as db:
+                await db.executemany(
+                    """INSERT OR IGNORE INTO media_files (content_hash, url, thumbnail_url, size)
+                       VALUES (?, ?, ?, ?)""",
+                    [(content_hash, url, thumbnail_url, size)
+                     for content_hash, _, url, thumbnail_url, size in files]
+                )
+                await db.executemany(
+                    "INSERT OR IGNORE INTO media_file_ids (file_unique_id, content_hash) VALUES (?, ?)",
+                    [(file_unique_id, content_hash)
+                     for content_hash, file_unique_id, _, _, _ in files if file_unique_id]
+                )
+                await db.commit()
+                return True
+                
+        except Exception as e:
+            logger.error(f"Ошибка регистрации медиафайлов: {e}")
+            return False
@@ -0,0 +1,203 @@
+"""
+Декодирование голосовых сообщений
+
+Голосовые (OGG/Opus) передаются в ffmpeg и обратно через каналы
+процесса, без временных файлов. Остальные контейнеры (MP4/M4A из
+message.audio и др.) могут хранить индекс в конце файла и читаются
+только с перемоткой - их ffmpeg получает через временный файл.
+На выходе - PCM 16 бит моно с частотой распознавателя (SPEECH_SAMPLE_RATE).
+
+Длинные записи режутся на фрагменты по паузам: паузы находит фильтр
+silencedetect того же процесса ffmpeg, что декодирует запись.
+"""
+import asyncio
+import logging
+import os
+import re
+import tempfile
+from typing import List, NamedTuple, Optional, Tuple
+
+from settings.config import (
+    FFMPEG_BINARY, SPEECH_SAMPLE_RATE, EXECUTOR_AUDIO_WORKERS,
+    SPEECH_SILENCE_THRESHOLD_DB, SPEECH_SILENCE_MIN_SECONDS
+)
+from utils.executors import executors
+
+logger = logging.getLogger(__name__)
+
+# Байт на отсчёт PCM s16le
+SAMPLE_WIDTH = 2
+
+# Контейнеры, которые ffmpeg читает из канала без перемотки
+PIPE_MIME_TYPES = ('audio/ogg', 'audio/opus')
+
+SILENCE_START = re.compile(r'silence_start: (-?[\d.]+)')
+SILENCE_END = re.compile(r'silence_end: (-?[\d.]+)')
+
+_decode_semaphore: Optional[asyncio.Semaphore] = None
+
+
+class AudioDecodeError(Exception):
+    """Ошибка декодирования аудио в ffmpeg"""
+
+
+class DecodedAudio(NamedTuple):
+    """PCM и найденные в записи паузы"""
+    pcm: bytes
+    sample_rate: int
+    # (начало, конец) пауз в секундах
+    silences: List[Tuple[float, float]]
+
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / (self.sample_rate * SAMPLE_WIDTH)
+
+
+def _get_decode_semaphore() -> asyncio.Semaphore:
+    # Одновременных процессов ffmpeg не больше EXECUTOR_AUDIO_WORKERS
+    global _decode_semaphore
+    if _decode_semaphore is None:
+        _decode_semaphore = asyncio.Semaphore(max(1, EXECUTOR_AUDIO_WORKERS))
+    return _decode_semaphore
+
+
+def is_pipe_safe(mime_type: Optional[str]) -> bool:
+    """Можно ли передать аудио в ffmpeg через канал (без перемотки)"""
+    return (mime_type or '').split(';')[0].strip().lower() in PIPE_MIME_TYPES
+
+
+def _write_temp(data: bytes) -> str:
+    with tempfile.NamedTemporaryFile(prefix='audio_', delete=False) as file:
+        file.write(data)
+        return file.name
+
+
+async def _run_ffmpeg(
+    data: bytes, sample_rate: int, log_level: str, filters: List[str], mime_type: Optional[str]
+) -> Tuple[bytes, str]:
+    temp_path = None
+    if not is_pipe_safe(mime_type):
+        temp_path = await executors.run('storage', _write_temp, data)
+
+    try:
+        async with _get_decode_semaphore():
+            process = await asyncio.create_subprocess_exec(
+                FFMPEG_BINARY, '-nostdin', '-hide_banner', '-nostats', '-loglevel', log_level,
+                '-i', temp_path or 'pipe:0',
+                *filters,
+                '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', '1', '-ar', str(sample_rate),
+                'pipe:1',
+                stdin=asyncio.subprocess.DEVNULL if temp_path else asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                pcm, stderr = await process.communicate(None if temp_path else data)
+            except BaseException:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                raise
+    finally:
+        if temp_path:
+            await asyncio.shield(executors.run('storage', os.remove, temp_path))
+
+    log = stderr.decode(errors='replace')
+    if process.returncode != 0:
+        lines = log.strip().splitlines()
+        raise AudioDecodeError(lines[-1] if lines else f"код возврата {process.returncode}")
+    return pcm, log
+
+
+async def decode_to_pcm(
+    data: bytes, sample_rate: int = SPEECH_SAMPLE_RATE, mime_type: Optional[str] = None
+) -> bytes:
+    """
+    Декодирование аудио (OGG/Opus, MP3 и др.) в PCM
+
+    Args:
+        data: Содержимое аудиофайла
+        sample_rate: Частота дискретизации результата, Гц
+        mime_type: MIME-тип файла; через канал передаются только OGG/Opus,
+            остальное (и неизвестный тип) - через временный файл
+
+    Returns:
+        bytes: PCM s16le, моно
+    """
+    pcm, _ = await _run_ffmpeg(data, sample_rate, 'error', [], mime_type)
+    return pcm
+
+
+async def decode_with_silences(
+    data: bytes,
+    sample_rate: int = SPEECH_SAMPLE_RATE,
+    threshold_db: float = SPEECH_SILENCE_THRESHOLD_DB,
+    min_silence: float = SPEECH_SILENCE_MIN_SECONDS,
+    mime_type: Optional[str] = None
+) -> DecodedAudio:
+    """
+    Декодирование в PCM с поиском пауз за один запуск ffmpeg
+
+    Args:
+        data: Содержимое аудиофайла
+        sample_rate: Частота дискретизации результата, Гц
+        threshold_db: Уровень, ниже которого звук считается тишиной, дБ
+        min_silence: Минимальная длительность паузы, секунды
+        mime_type: MIME-тип файла (см. decode_to_pcm)
+    """
+    pcm, log = await _run_ffmpeg(
+        data, sample_rate, 'info', ['-af', f"silencedetect=noise={threshold_db}dB:d={min_silence}"], mime_type
+    )
+    audio = DecodedAudio(pcm, sample_rate, [])
+
+    start = None
+    for line in log.splitlines():
+        match = SILENCE_START.search(line)
+        if match:
+            start = max(0.0, float(match.group(1)))
+            continue
+        match = SILENCE_END.search(line)
+        if match and start is not None:
+            audio.silences.append((start, float(match.group(1))))
+            start = None
+    # Запись заканчивается паузой
+    if start is not None:
+        audio.silences.append((start, audio.duration))
+    return audio
+
+
+def split_on_silence(audio: DecodedAudio, max_segment: float) -> List[bytes]:
+    """
+    Разбиение записи на фрагменты не длиннее max_segment секунд
+
+    Фрагмент режется посередине последней паузы во второй половине
+    допустимой длины; если пауз там нет - ровно по max_segment.
+    Паузы, занимающие фрагмент целиком, отбрасываются.
+    """
+    # Иначе граница фрагмента не сдвигается и цикл не завершится
+    assert max_segment > 0, f"Длина фрагмента должна быть положительной: {max_segment}"
+    duration = audio.duration
+    bounds = []
+    start = 0.0
+    while duration - start > max_segment:
+        window_start, window_end = start + max_segment / 2, start + max_segment
+        cut = window_end
+        for silence_start, silence_end in audio.silences:
+            middle = (silence_start + silence_end) / 2
+            if window_start <= middle <= window_end:
+                cut = middle
+        bounds.append((start, cut))
+        start = cut
+    bounds.append((start, duration))
+
+    segments = []
+    for segment_start, segment_end in bounds:
+        if any(start <= segment_start and segment_end <= end for start, end in audio.silences):
+            continue
+        # Границы выравниваются по отсчётам
+        first = int(segment_start * audio.sample_rate) * SAMPLE_WIDTH
+        last = min(len(audio.pcm), int(segment_end * audio.sample_rate) * SAMPLE_WIDTH)
+        if last > first:
+            segments.append(audio.pcm[first:last])
+
+    return segments
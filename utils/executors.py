@@ -0,0 +1,154 @@
+"""
+Пулы потоков и процессов для блокирующей работы
+
+Каждый класс нагрузки получает свой ограниченный пул, чтобы всплеск
+голосовых сообщений не занимал потоки, нужные сохранению фото.
+Размеры пулов задаются в settings/config.py.
+"""
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from settings.config import (
+    EXECUTOR_STORAGE_WORKERS, EXECUTOR_SPEECH_WORKERS, EXECUTOR_IMAGE_WORKERS
+)
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentedExecutor:
+    """
+    Пул с учётом занятости
+
+    Задачи, отправленные сверх max_workers, ждут в очереди пула.
+    Учёт ведётся по futures, поэтому одинаково работает для потоков
+    и процессов.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        kind: str,
+        max_workers: int,
+        initializer: Optional[Callable] = None,
+        initargs: Tuple = ()
+    ):
+        self.name = name
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        # Выполняется один раз в каждом воркере (например, загрузка модели)
+        self.initializer = initializer
+        self.initargs = initargs
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self._in_flight = 0
+        self._executor: Optional[Executor] = None
+
+    @property
+    def active(self) -> int:
+        """Задачи, выполняющиеся прямо сейчас"""
+        return min(self._in_flight, self.max_workers)
+
+    @property
+    def queued(self) -> int:
+        """Задачи, ожидающие свободного воркера"""
+        return max(0, self._in_flight - self.max_workers)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == 'process':
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, initializer=self.initializer, initargs=self.initargs
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix=self.name,
+                    initializer=self.initializer, initargs=self.initargs
+                )
+        return self._executor
+
+    def submit(self, func: Callable, *args) -> asyncio.Future:
+        """Отправка задачи в пул; возвращает asyncio future"""
+        future = asyncio.get_event_loop().run_in_executor(self._get_executor(), func, *args)
+        self.submitted += 1
+        self._in_flight += 1
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: asyncio.Future):
+        self._in_flight -= 1
+        if future.cancelled() or future.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    async def run(self, func: Callable, *args) -> Any:
+        return await self.submit(func, *args)
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'max_workers': self.max_workers,
+            'active': self.active,
+            'queued': self.queued,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed
+        }
+
+
+class ExecutorRegistry:
+    """Именованные пулы; создаются при первом использовании"""
+
+    def __init__(self, specs: Dict[str, Tuple[str, int]]):
+        self._executors = {
+            name: InstrumentedExecutor(name, kind, size)
+            for name, (kind, size) in specs.items()
+        }
+
+    def get(self, name: str) -> InstrumentedExecutor:
+        return self._executors[name]
+
+    def register(
+        self,
+        name: str,
+        kind: str,
+        max_workers: int,
+        initializer: Optional[Callable] = None,
+        initargs: Tuple = ()
+    ) -> InstrumentedExecutor:
+        """Добавление пула (при повторной регистрации возвращается существующий)"""
+        if name not in self._executors:
+            self._executors[name] = InstrumentedExecutor(name, kind, max_workers, initializer, initargs)
+        return self._executors[name]
+
+    def submit(self, name: str, func: Callable, *args) -> asyncio.Future:
+        return self._executors[name].submit(func, *args)
+
+    async def run(self, name: str, func: Callable, *args) -> Any:
+        return await self._executors[name].run(func, *args)
+
+    def shutdown(self, wait: bool = True):
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait)
+        logger.info("Пулы потоков и процессов остановлены")
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Занятость и очередь по пулам"""
+        return {name: executor.stats() for name, executor in self._executors.items()}
+
+
+executors = ExecutorRegistry({
+    # Запись файлов LocalStorage
+    'storage': ('thread', EXECUTOR_STORAGE_WORKERS),
+    # Запросы к сервису распознавания речи
+    'speech': ('thread', EXECUTOR_SPEECH_WORKERS),
+    # Пережатие фото (нагружает CPU)
+    'image': ('process', EXECUTOR_IMAGE_WORKERS)
+})
@@ -1,115 +1,415 @@
 """Модуль для работы с Google Sheets API"""
-import gspread
-from google.oauth2.service_account import Credentials
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 import logging
 import asyncio
-from typing import List, Optional
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import aiohttp
 
 from settings.config import (
     GOOGLE_CREDENTIALS_FILE, SPREADSHEET_ID, WORKSHEET_NAME,
-    SHEETS_START_ROW, SHEETS_COLUMNS
+    SHEETS_START_ROW, SHEETS_COLUMNS, SHEETS_BATCH_SIZE, SHEETS_FLUSH_INTERVAL,
+    SHEETS_PARTITION_FORMAT, SHEETS_BACKFILL_CHUNK
 )
+from utils.sheets_client import AsyncSheetsClient, ServiceAccountToken
 
 logger = logging.getLogger(__name__)
 
 
+def column_index(letter: str) -> int:
+    """Номер колонки по букве (A -> 1, AA -> 27)"""
+    index = 0
+    for char in letter.upper():
+        index = index * 26 + ord(char) - ord('A') + 1
+    return index
+
+
+# Порядок колонок строки жалобы (от первой к последней колонке листа)
+ROW_COLUMNS = sorted(SHEETS_COLUMNS, key=lambda key: column_index(SHEETS_COLUMNS[key]))
+FIRST_COLUMN = SHEETS_COLUMNS[ROW_COLUMNS[0]]
+LAST_COLUMN = SHEETS_COLUMNS[ROW_COLUMNS[-1]]
+
+HEADERS = {
+    'ID': 'ID',
+    'DATE': 'Дата',
+    'TIME': 'Время',
+    'CATEGORY': 'Категория',
+    'MASTER': 'Мастер',
+    'PHOTO_1': 'Фото 1',
+    'PHOTO_2': 'Фото 2',
+    'PHOTO_3': 'Фото 3',
+    'COMMENT': 'Комментарий'
+}
+
+MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+
+# Первая строка диапазона из ответа values:append ('Report'!A5:I7 -> 5)
+UPDATED_RANGE_ROW = re.compile(r'![A-Z]+(\d+)')
+
+# За сколько до смены периода заранее создаётся лист следующего периода
+PARTITION_PREWARM = timedelta(days=1)
+
+
+class SheetsOutbox:
+    """
+    Буфер строк для записи в лист
+    
+    Строки, пришедшие почти одновременно, записываются одним непрерывным
+    диапазоном на каждый лист (ключ). Запись происходит, когда набралось
+    max_batch строк или прошло flush_interval секунд с момента появления
+    первой строки.
+    
+    Строки, которых уже никто не ждёт (put отменён, например при остановке
+    SheetsSyncWorker), не записываются: жалоба остаётся неотмеченной в
+    sheets_outbox и будет записана при следующем запуске. Надёжная копия -
+    таблица sheets_outbox, а не этот буфер.
+    """
+    
+    def __init__(
+        self,
+        write_rows: Callable[[str, List[List[str]]], Awaitable[int]],
+        max_batch: int = SHEETS_BATCH_SIZE,
+        flush_interval: float = SHEETS_FLUSH_INTERVAL
+    ):
+        self.write_rows = write_rows
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = flush_interval
+        self.flushes = 0
+        self._pending: List[Tuple[str, List[str], asyncio.Future]] = []
+        self._not_empty: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+    
+    def start(self):
+        if self._task is not None:
+            return
+        self._not_empty = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="sheets-outbox")
+    
+    async def close(self):
+        """Запись оставшихся строк, которые ещё ждут, и остановка"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        while self._pending:
+            await self._flush()
+    
+    async def put(self, key: str, row: List[str]) -> int:
+        """
+        Постановка строки в буфер
+        
+        Args:
+            key: Лист, в который записывается строка
+            row: Значения строки
+        
+        Returns:
+            int: Номер строки листа, в которую записаны значения
+        """
+        if self._task is None:
+            raise RuntimeError("Буфер Google Sheets не запущен")
+        
+        future = asyncio.get_event_loop().create_future()
+        self._pending.append((key, row, future))
+        self._not_empty.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        return await future
+    
+    async def _run(self):
+        while True:
+            await self._not_empty.wait()
+            if len(self._pending) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            await self._flush()
+    
+    async def _flush(self):
+        batch = self._pending[:self.max_batch]
+        del self._pending[:self.max_batch]
+        if not self._pending:
+            self._not_empty.clear()
+        if len(self._pending) < self.max_batch:
+            self._full.clear()
+        if not batch:
+            return
+        
+        groups: Dict[str, List[Tuple[List[str], asyncio.Future]]] = {}
+        for key, row, future in batch:
+            if future.done():
+                continue
+            groups.setdefault(key, []).append((row, future))
+        
+        for key, group in groups.items():
+            try:
+                first_row = await self.write_rows(key, [row for row, _ in group])
+            except Exception as e:
+                for _, future in group:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            self.flushes += 1
+            for offset, (_, future) in enumerate(group):
+                if not future.done():
+                    future.set_result(first_row + offset)
+
+
 class GoogleSheetsManager:
-    def __init__(self):
-        self.gc = None
-        self.worksheet = None
-        self.spreadsheet = None
+    def __init__(self, partition_format: str = SHEETS_PARTITION_FORMAT):
+        self.client: Optional[AsyncSheetsClient] = None
+        self.worksheet = WORKSHEET_NAME
+        self.partition_format = partition_format
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._owns_session = False
+        # Листы таблицы и листы, уже готовые к записи (с заголовками).
+        # Строки добавляются через values:append - сервер сам ставит их
+        # после последней заполненной строки и расширяет сетку листа,
+        # поэтому курсор и чтение перед записью не нужны
+        self._titles: Set[str] = set()
+        self._ready: Set[str] = set()
+        self._worksheet_lock = asyncio.Lock()
+        self._prewarm_task: Optional[asyncio.Task] = None
+        self.outbox = SheetsOutbox(self._write_rows)
     
-    async def initialize(self):
+    async def initialize(self, session: Optional[aiohttp.ClientSession] = None):
+        """
+        Подключение к таблице
+        
+        Args:
+            session: Общая HTTP-сессия владельца; без неё создаётся своя
+        """
         try:
             logger.info("Инициализация Google Sheets...")
-            await asyncio.get_event_loop().run_in_executor(None, self._sync_initialize)
+            
+            self._owns_session = session is None
+            self._session = session or aiohttp.ClientSession()
+            self.client = AsyncSheetsClient(
+                self._session,
+                ServiceAccountToken(GOOGLE_CREDENTIALS_FILE),
+                SPREADSHEET_ID
+            )
+            
+            self._titles = set(await self.client.get_sheet_titles())
+            await self._ensure_worksheet(self.worksheet_title(datetime.now(MOSCOW_TZ)))
+            self._schedule_prewarm()
+            
+            self.outbox.start()
             logger.info("Google Sheets инициализированы")
         except Exception as e:
             logger.error(f"Ошибка инициализации Google Sheets: {e}")
             raise
     
-    def _sync_initialize(self):
-        try:
-            scope = [
-                'https://www.googleapis.com/auth/spreadsheets',
-                'https://www.googleapis.com/auth/drive'
-            ]
-            
-            creds = Credentials.from_service_account_file(GOOGLE_CREDENTIALS_FILE, scopes=scope)
-            self.gc = gspread.authorize(creds)
-            self.spreadsheet = self.gc.open_by_key(SPREADSHEET_ID)
+    async def close(self):
+        """Запись строк, оставшихся в буфере, и закрытие собственной HTTP-сессии"""
+        await self.outbox.close()
+        if self._prewarm_task is not None:
+            await asyncio.gather(self._prewarm_task, return_exceptions=True)
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
+    
+    def worksheet_title(self, moment: datetime) -> str:
+        """Лист, в который попадает жалоба с указанным временем"""
+        if not self.partition_format:
+            return self.worksheet
+        return f"{self.worksheet} {moment.strftime(self.partition_format)}"
+    
+    @staticmethod
+    def _quote_sheet(title: str) -> str:
+        return "'" + title.replace("'", "''") + "'"
+    
+    def _row_range(self, title: str, row: int, count: int = 1) -> str:
+        return f"{self._quote_sheet(title)}!{FIRST_COLUMN}{row}:{LAST_COLUMN}{row + count - 1}"
+    
+    async def _ensure_worksheet(self, title: str):
+        """
+        Подготовка листа к записи
+        
+        Лист создаётся с заголовками, если его нет. В существующем листе
+        (созданном до появления колонки ID) дописывается заголовок ID,
+        если ячейка пуста. Для уже подготовленного листа запросов к API
+        не выполняется.
+        """
+        if title in self._ready:
+            return
+        
+        async with self._worksheet_lock:
+            if title in self._ready:
+                return
             
-            try:
-                self.worksheet = self.spreadsheet.worksheet(WORKSHEET_NAME)
-            except gspread.WorksheetNotFound:
-                self.worksheet = self.spreadsheet.add_worksheet(
-                    title=WORKSHEET_NAME, 
-                    rows=1000, 
-                    cols=8
-                )
-                headers = ['Дата', 'Время', 'Категория', 'Мастер', 'Фото 1', 'Фото 2', 'Фото 3', 'Комментарий']
-                self.worksheet.append_row(headers)
-                
+            if title not in self._titles:
+                await self.client.add_sheet(title, rows=1000, cols=column_index(LAST_COLUMN))
+                await self.client.update_values(self._row_range(title, 1), [[HEADERS[key] for key in ROW_COLUMNS]])
+                self._titles.add(title)
+                logger.info(f"Создан лист Google Sheets: {title}")
+            else:
+                await self._ensure_id_header(title)
+            self._ready.add(title)
+    
+    async def _ensure_id_header(self, title: str):
+        header_cell = f"{self._quote_sheet(title)}!{SHEETS_COLUMNS['ID']}1"
+        if await self.client.get_values(header_cell):
+            return
+        await self.client.update_values(header_cell, [[HEADERS['ID']]])
+        logger.info(f"В лист Google Sheets {title} добавлен заголовок {HEADERS['ID']}")
+    
+    def _schedule_prewarm(self):
+        """Заранее готовит лист следующего периода, чтобы смена периода не замедляла запись"""
+        if not self.partition_format:
+            return
+        if self._prewarm_task is not None and not self._prewarm_task.done():
+            return
+        
+        upcoming = self.worksheet_title(datetime.now(MOSCOW_TZ) + PARTITION_PREWARM)
+        if upcoming in self._ready:
+            return
+        
+        self._prewarm_task = asyncio.create_task(self._prewarm(upcoming))
+    
+    async def _prewarm(self, title: str):
+        try:
+            await self._ensure_worksheet(title)
         except Exception as e:
-            logger.error(f"Ошибка инициализации: {e}")
-            raise
+            logger.warning(f"Не удалось заранее подготовить лист {title}: {e}")
+    
+    async def read_rows(self, title: str, columns: Optional[str] = None, unformatted: bool = False) -> List[List[Any]]:
+        """
+        Содержимое листа (пустой список, если листа нет)
+        
+        Args:
+            title: Название листа
+            columns: Диапазон колонок, например "A:A"; по умолчанию весь лист
+            unformatted: Значения без форматирования (даты и время - серийными числами)
+        """
+        if title not in self._titles:
+            return []
+        range_name = self._quote_sheet(title)
+        if columns:
+            range_name += f"!{columns}"
+        return await self.client.get_values(range_name, unformatted)
     
-    async def add_complaint(self, category: str, master: str, comment: str, photo_urls: List[str] = None) -> bool:
+    @staticmethod
+    def _build_row(
+        category: str,
+        master: str,
+        comment: str,
+        photo_urls: List[str] = None,
+        moment: Optional[datetime] = None,
+        complaint_id: Optional[int] = None,
+        thumbnail_urls: List[str] = None
+    ) -> List[str]:
+        """Значения строки жалобы в порядке колонок листа"""
+        now = moment or datetime.now(MOSCOW_TZ)
+        
+        # В ячейку - миниатюра, если она есть; полный размер остаётся в базе
+        photo_urls = photo_urls or []
+        thumbnail_urls = thumbnail_urls or []
+        previews = [
+            (thumbnail_urls[index] if index < len(thumbnail_urls) else '') or url
+            for index, url in enumerate(photo_urls[:3])
+        ]
+        photos = [f'=IMAGE("{url}")' if url else '' for url in previews]
+        photos += [''] * (3 - len(photos))
+        
+        values = {
+            'ID': str(complaint_id) if complaint_id is not None else '',
+            'DATE': now.strftime('%d.%m.%Y'),
+            'TIME': now.strftime('%H:%M'),
+            'CATEGORY': category,
+            'MASTER': master,
+            'PHOTO_1': photos[0],
+            'PHOTO_2': photos[1],
+            'PHOTO_3': photos[2],
+            'COMMENT': comment
+        }
+        return [values[key] for key in ROW_COLUMNS]
+    
+    def complaint_row(
+        self,
+        category: str,
+        master: str,
+        comment: str,
+        photo_urls: List[str] = None,
+        created_at: Optional[datetime] = None,
+        complaint_id: Optional[int] = None,
+        thumbnail_urls: List[str] = None
+    ) -> Tuple[str, List[str]]:
+        """
+        Лист и значения строки жалобы
+        
+        Returns:
+            Tuple[str, List[str]]: (название листа, значения строки)
+        """
+        moment = created_at.astimezone(MOSCOW_TZ) if created_at else datetime.now(MOSCOW_TZ)
+        row = self._build_row(category, master, comment, photo_urls, moment, complaint_id, thumbnail_urls)
+        return self.worksheet_title(moment), row
+    
+    async def add_complaint(
+        self,
+        category: str,
+        master: str,
+        comment: str,
+        photo_urls: List[str] = None,
+        created_at: Optional[datetime] = None,
+        complaint_id: Optional[int] = None,
+        thumbnail_urls: List[str] = None
+    ) -> bool:
         try:
-            result = await asyncio.get_event_loop().run_in_executor(
-                None, self._sync_add_complaint, category, master, comment, photo_urls
+            title, row_values = self.complaint_row(
+                category, master, comment, photo_urls, created_at, complaint_id, thumbnail_urls
             )
-            return result
+            row = await self.outbox.put(title, row_values)
+            logger.info(f"Жалоба добавлена в строку {row} ({title}): {category} - {master}")
+            return True
         except Exception as e:
             logger.error(f"Ошибка добавления жалобы: {e}")
             return False
     
-    def _sync_add_complaint(self, category: str, master: str, comment: str, photo_urls: List[str] = None) -> bool:
+    async def _write_rows(self, title: str, rows: List[List[str]]) -> int:
+        """
+        Добавление строк одним непрерывным диапазоном после последней
+        заполненной строки листа (values:append, INSERT_ROWS)
+        
+        Returns:
+            int: Номер первой записанной строки
+        """
         try:
-            moscow_tz = pytz.timezone('Europe/Moscow')
-            now = datetime.now(moscow_tz)
-            date_str = now.strftime('%d.%m.%Y')
-            time_str = now.strftime('%H:%M')
-            
-            # Находим следующую пустую строку
-            all_values = self.worksheet.get_all_values()
-            next_row = len(all_values) + 1
-            
-            data_to_update = {
-                SHEETS_COLUMNS['DATE']: date_str,
-                SHEETS_COLUMNS['TIME']: time_str,
-                SHEETS_COLUMNS['CATEGORY']: category,
-                SHEETS_COLUMNS['MASTER']: master,
-                SHEETS_COLUMNS['COMMENT']: comment
-            }
-            
-            photo_urls = photo_urls or []
-            photo_columns = [SHEETS_COLUMNS['PHOTO_1'], SHEETS_COLUMNS['PHOTO_2'], SHEETS_COLUMNS['PHOTO_3']]
-            
-            for i, photo_url in enumerate(photo_urls[:3]):
-                if photo_url:
-                    data_to_update[photo_columns[i]] = f'=IMAGE("{photo_url}")'
-                else:
-                    data_to_update[photo_columns[i]] = ''
+            await self._ensure_worksheet(title)
             
-            for i in range(len(photo_urls), 3):
-                data_to_update[photo_columns[i]] = ''
-            
-            updates = []
-            for column, value in data_to_update.items():
-                cell_address = f"{column}{next_row}"
-                updates.append({
-                    'range': cell_address,
-                    'values': [[value]]
-                })
-            
-            self.worksheet.batch_update(updates, value_input_option='USER_ENTERED')
+            body = await self.client.append_values(
+                f"{self._quote_sheet(title)}!{FIRST_COLUMN}:{LAST_COLUMN}", rows
+            )
+            match = UPDATED_RANGE_ROW.search(body.get('updates', {}).get('updatedRange', ''))
+            first_row = int(match.group(1)) if match else 0
             
-            logger.info(f"Жалоба добавлена в строку {next_row}: {category} - {master}")
-            return True
+            logger.info(f"В Google Sheets ({title}) записано строк: {len(rows)} (с {first_row})")
+            self._schedule_prewarm()
+            return first_row
             
         except Exception as e:
-            logger.error(f"Ошибка добавления: {e}")
-            return False
\ No newline at end of file
+            logger.error(f"Ошибка записи строк: {e}")
+            raise
+    
+    async def write_rows(self, title: str, rows: List[List[str]], chunk_size: int = SHEETS_BACKFILL_CHUNK) -> int:
+        """
+        Массовая запись строк в обход буфера (дозаливка)
+        
+        Строки пишутся непрерывными диапазонами по chunk_size строк -
+        один запрос на диапазон, а не на строку.
+        
+        Returns:
+            int: Количество записанных строк
+        """
+        for start in range(0, len(rows), chunk_size):
+            await self._write_rows(title, rows[start:start + chunk_size])
+        return len(rows)
@@ -0,0 +1,27 @@
+"""Общий HTTP-клиент для исходящих запросов (Telegram-файлы, Google)"""
+import aiohttp
+
+from settings.config import (
+    HTTP_POOL_LIMIT, HTTP_POOL_LIMIT_PER_HOST, HTTP_DNS_CACHE_TTL,
+    HTTP_KEEPALIVE_TIMEOUT, HTTP_REQUEST_TIMEOUT
+)
+
+
+def create_http_session() -> aiohttp.ClientSession:
+    """
+    Долгоживущая сессия с пулом соединений
+
+    Соединения переиспользуются (keep-alive), DNS кэшируется, число
+    соединений к одному хосту ограничено. Создаётся внутри работающего
+    event loop и закрывается владельцем (BotManager).
+    """
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_LIMIT,
+        limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+        ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=HTTP_REQUEST_TIMEOUT)
+    )
@@ -0,0 +1,66 @@
+"""
+Пережатие фото перед сохранением
+
+Функции выполняются в пуле процессов (utils/executors.py), поэтому
+объявлены на уровне модуля и принимают только сериализуемые аргументы.
+"""
+from io import BytesIO
+from typing import Tuple
+
+from PIL import Image, ImageOps
+
+FORMATS = {
+    # формат -> (имя кодека Pillow, расширение, MIME-тип)
+    'webp': ('WEBP', 'webp', 'image/webp'),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg')
+}
+
+
+def _encode(image: Image.Image, image_format: str, quality: int) -> bytes:
+    """Кодирование без метаданных (EXIF, GPS, ICC не передаются)"""
+    codec = FORMATS[image_format][0]
+    if codec == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    output = BytesIO()
+    if codec == 'JPEG':
+        image.save(output, codec, quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(output, codec, quality=quality, method=4)
+    return output.getvalue()
+
+
+def process_image(
+    data: bytes,
+    max_dimension: int,
+    thumbnail_size: int,
+    image_format: str,
+    quality: int
+) -> Tuple[bytes, bytes]:
+    """
+    Пережатие фото и создание миниатюры
+
+    Ориентация из EXIF применяется к пикселям, метаданные отбрасываются,
+    изображение уменьшается до max_dimension по большей стороне.
+
+    Args:
+        data: Исходный файл
+        max_dimension: Максимальный размер большей стороны, px
+        thumbnail_size: Максимальный размер большей стороны миниатюры, px
+        image_format: Ключ FORMATS
+        quality: Качество сжатия (1-100)
+
+    Returns:
+        Tuple[bytes, bytes]: (фото, миниатюра)
+    """
+    with Image.open(BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        full = _encode(image, image_format, quality)
+
+        thumbnail = image.copy()
+        thumbnail.thumbnail((thumbnail_size, thumbnail_size), Image.LANCZOS)
+        return full, _encode(thumbnail, image_format, quality)
@@ -1,37 +1,105 @@
 """Модуль для работы с медиафайлами и S3 хранилищем"""
 import logging
 import asyncio
+import hashlib
+import time
 import uuid
-import os
-import tempfile
 from datetime import datetime
-from typing import Optional
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Set, Tuple
 from aiogram.types import PhotoSize, Voice
 from aiogram import Bot
-import boto3
-from botocore.exceptions import ClientError
 import aiohttp
-import speech_recognition as sr
-from pydub import AudioSegment
 
 from settings.config import (
-    S3_ENDPOINT_URL, S3_BUCKET_NAME, S3_ACCESS_KEY, 
-    S3_SECRET_KEY, S3_REGION
+    S3_UPLOAD_CONCURRENCY, PHOTO_UPLOAD_TTL, DOWNLOAD_CHUNK_SIZE, MAX_PHOTO_SIZE,
+    IMAGE_PROCESSING, IMAGE_FORMAT, IMAGE_MAX_DIMENSION, IMAGE_QUALITY, THUMBNAIL_SIZE,
+    MEDIA_DEDUP, SPEECH_SEGMENT_SECONDS
 )
+from settings.database import Database
+from utils.audio import DecodedAudio, decode_with_silences, split_on_silence
+from utils.executors import executors
+from utils.images import FORMATS, process_image
+from utils.media_storage import MediaStorage, MediaTooLargeError, create_media_storage
+from utils.speech import SpeechEngine, create_speech_engine
 
 logger = logging.getLogger(__name__)
 
+# Каталог миниатюр в хранилище
+THUMBNAILS_PREFIX = 'thumbs/'
+
+
+class StoredPhoto(NamedTuple):
+    """Сохранённое фото: полный размер и миниатюра для таблицы"""
+    url: str
+    thumbnail_url: Optional[str] = None
+    # SHA-256 исходного файла из Telegram
+    content_hash: Optional[str] = None
+    file_unique_id: Optional[str] = None
+    size: int = 0
+    # Использован ранее сохранённый файл - удалять его при отмене нельзя
+    reused: bool = False
+    # Имя файла в хранилище (только для нового файла)
+    key: Optional[str] = None
+
 
 class MediaHandler:
-    def __init__(self):
-        self.s3_client = boto3.client(
-            's3',
-            endpoint_url=S3_ENDPOINT_URL,
-            aws_access_key_id=S3_ACCESS_KEY,
-            aws_secret_access_key=S3_SECRET_KEY,
-            region_name=S3_REGION
-        )
-        logger.info("S3 клиент инициализирован")
+    def __init__(
+        self,
+        session: Optional[aiohttp.ClientSession] = None,
+        storage: Optional[MediaStorage] = None,
+        db: Optional[Database] = None,
+        speech_engine: Optional[SpeechEngine] = None
+    ):
+        self.storage = storage or create_media_storage(session)
+        logger.info(f"Хранилище медиафайлов: {type(self.storage).__name__}")
+        
+        self.speech_engine = speech_engine or create_speech_engine()
+        logger.info(f"Распознавание речи: {self.speech_engine.version}")
+        
+        # Без базы дедупликация фото отключена
+        self.db = db if MEDIA_DEDUP else None
+        self.dedup_hits = 0
+        
+        # Сессию передаёт владелец (BotManager); без неё создаётся своя
+        self._session = session
+        self._owns_session = False
+        self._upload_semaphore: Optional[asyncio.Semaphore] = None
+        # upload_id -> (задача загрузки, имя файла в S3, время последнего обращения)
+        self._uploads: Dict[str, Tuple[asyncio.Task, str, float]] = {}
+        self._cleanup_tasks: Set[asyncio.Task] = set()
+    
+    def set_session(self, session: aiohttp.ClientSession):
+        """Использование внешней HTTP-сессии (закрывает её владелец)"""
+        self._session = session
+        self._owns_session = False
+        self.storage.set_session(session)
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """HTTP-сессия для скачивания файлов из Telegram"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+            self._owns_session = True
+        return self._session
+    
+    def _get_upload_semaphore(self) -> asyncio.Semaphore:
+        if self._upload_semaphore is None:
+            self._upload_semaphore = asyncio.Semaphore(S3_UPLOAD_CONCURRENCY)
+        return self._upload_semaphore
+    
+    async def close(self):
+        """Отмена незавершённых загрузок и закрытие собственной HTTP-сессии"""
+        for task, _, _ in self._uploads.values():
+            task.cancel()
+        self._uploads.clear()
+        
+        if self._cleanup_tasks:
+            await asyncio.gather(*self._cleanup_tasks, return_exceptions=True)
+        
+        await self.storage.close()
+        await self.speech_engine.close()
+        
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
     
 
     def _generate_unique_filename(self, employee_name: str, file_extension: str = "jpg") -> str:
@@ -68,6 +136,7 @@ class MediaHandler:
 
             return {
                 'file_id': file.file_id,
+                'file_unique_id': file.file_unique_id,
                 'file_path': file.file_path,
                 'telegram_url': telegram_url,
                 'width': width,
@@ -80,125 +149,311 @@ class MediaHandler:
             return None
 
     
-    def _sync_upload_to_s3(self, photo_data: bytes, filename: str):
+    @staticmethod
+    def _file_extension() -> str:
+        return FORMATS[IMAGE_FORMAT][1] if IMAGE_PROCESSING else 'jpg'
+    
+    @staticmethod
+    def _thumbnail_key(filename: str) -> str:
+        return f"{THUMBNAILS_PREFIX}{filename}"
+    
+    @staticmethod
+    async def _hashing(chunks: AsyncIterator[bytes], digest) -> AsyncIterator[bytes]:
+        """Передача чанков дальше с подсчётом хеша"""
+        async for chunk in chunks:
+            digest.update(chunk)
+            yield chunk
+    
+    @staticmethod
+    async def _read_body(response: aiohttp.ClientResponse, digest) -> bytes:
+        """Чтение тела ответа с проверкой MAX_PHOTO_SIZE и подсчётом хеша"""
+        data = bytearray()
+        async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+            data += chunk
+            if len(data) > MAX_PHOTO_SIZE:
+                raise MediaTooLargeError(f"Размер файла превышает {MAX_PHOTO_SIZE}")
+            digest.update(chunk)
+        return bytes(data)
+    
+    async def _find_stored(self, content_hash: Optional[str] = None, file_unique_id: Optional[str] = None) -> Optional[StoredPhoto]:
+        """Ранее сохранённое фото с тем же содержимым"""
+        if self.db is None or not (content_hash or file_unique_id):
+            return None
+        
+        found = await self.db.find_media(content_hash, file_unique_id)
+        if found is None:
+            return None
+        
+        self.dedup_hits += 1
+        found_hash, url, thumbnail_url = found
+        return StoredPhoto(url, thumbnail_url, found_hash, file_unique_id, reused=True)
+    
+    async def _upload_photo(self, photo_info: dict, filename: str) -> StoredPhoto:
+        """
+        Передача одного фото из Telegram в хранилище
+        
+        Фото пережимается в пуле процессов (utils/images.py), рядом
+        сохраняется миниатюра. Без IMAGE_PROCESSING оригинал передаётся
+        в хранилище потоком, не целиком.
+        
+        Повторно присланное фото не сохраняется: по file_unique_id
+        оно находится ещё до скачивания, по хешу содержимого - до
+        пережатия и загрузки.
+        """
+        file_unique_id = photo_info.get('file_unique_id')
+        stored = await self._find_stored(file_unique_id=file_unique_id)
+        if stored is not None:
+            logger.info(f"Фото уже сохранено (file_unique_id), используем {stored.url}")
+            return stored
+        
+        digest = hashlib.sha256()
+        async with self._get_upload_semaphore():
+            async with self._get_session().get(photo_info['telegram_url']) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"Ошибка скачивания фото: {response.status}")
+                if response.content_length and response.content_length > MAX_PHOTO_SIZE:
+                    raise MediaTooLargeError(f"Размер файла {response.content_length} превышает {MAX_PHOTO_SIZE}")
+                
+                if not IMAGE_PROCESSING:
+                    size = await self.storage.save(
+                        filename, self._hashing(response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE), digest)
+                    )
+                    content_hash = digest.hexdigest()
+                    stored = await self._find_stored(content_hash, file_unique_id)
+                    if stored is not None:
+                        # Хеш известен только после передачи - удаляем копию
+                        await self.storage.delete(filename)
+                        logger.info(f"Фото уже сохранено (хеш), используем {stored.url}")
+                        return stored
+                    
+                    logger.info(f"Фото загружено в хранилище: {filename} ({size} байт)")
+                    return StoredPhoto(self.storage.url(filename), None, content_hash, file_unique_id, size, key=filename)
+                
+                data = await self._read_body(response, digest)
+        
+        content_hash = digest.hexdigest()
+        stored = await self._find_stored(content_hash, file_unique_id)
+        if stored is not None:
+            logger.info(f"Фото уже сохранено (хеш), используем {stored.url}")
+            return stored
+        
         try:
-            self.s3_client.put_object(
-                Bucket=S3_BUCKET_NAME,
-                Key=filename,
-                Body=photo_data,
-                ContentType='image/jpeg',
-                ACL='public-read'
+            full, thumbnail = await executors.run(
+                'image', process_image, data, IMAGE_MAX_DIMENSION, THUMBNAIL_SIZE, IMAGE_FORMAT, IMAGE_QUALITY
             )
-        except ClientError as e:
-            logger.error(f"Ошибка загрузки в S3: {e}")
-            raise
-
-
+        except Exception as e:
+            # Не изображение или повреждённый файл - сохраняем как есть
+            logger.warning(f"Не удалось пережать фото {filename}, сохраняем оригинал: {e}")
+            await self.storage.save_bytes(filename, data, 'application/octet-stream')
+            return StoredPhoto(self.storage.url(filename), None, content_hash, file_unique_id, len(data), key=filename)
+        
+        content_type = FORMATS[IMAGE_FORMAT][2]
+        thumbnail_key = self._thumbnail_key(filename)
+        results = await asyncio.gather(
+            self.storage.save_bytes(filename, full, content_type),
+            self.storage.save_bytes(thumbnail_key, thumbnail, content_type),
+            return_exceptions=True
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            # Без пары файл не нужен - удаляем то, что успело сохраниться
+            for key, result in zip((filename, thumbnail_key), results):
+                if isinstance(result, BaseException):
+                    continue
+                try:
+                    await self.storage.delete(key)
+                except Exception as e:
+                    logger.warning(f"Не удалось удалить {key} из хранилища: {e}")
+            raise errors[0]
+        logger.info(
+            f"Фото загружено в хранилище: {filename} "
+            f"({len(data)} -> {len(full)} байт, миниатюра {len(thumbnail)} байт)"
+        )
+        return StoredPhoto(
+            self.storage.url(filename), self.storage.url(thumbnail_key), content_hash, file_unique_id, len(full),
+            key=filename
+        )
     
-    async def upload_photos_to_s3(self, bot: Bot, photo_infos: list, employee_name: str) -> list:
-        s3_urls = []
+    def start_photo_upload(self, photo_info: dict, employee_name: str) -> str:
+        """
+        Запуск фоновой загрузки фото сразу после его получения
         
-        for photo_info in photo_infos:
+        Args:
+            photo_info: Информация о фото из get_photo_info
+            employee_name: Имя сотрудника для имени файла
+            
+        Returns:
+            str: upload_id, который сохраняется в photo_info в данных FSM
+        """
+        self._sweep_uploads()
+        
+        upload_id = uuid.uuid4().hex
+        filename = self._generate_unique_filename(employee_name, self._file_extension())
+        task = asyncio.create_task(self._upload_photo(photo_info, filename))
+        self._uploads[upload_id] = (task, filename, time.monotonic())
+        return upload_id
+    
+    def touch_photo_uploads(self, photo_infos: list):
+        """Продление фоновых загрузок: предложение ещё заполняется"""
+        now = time.monotonic()
+        for photo_info in photo_infos or []:
+            upload_id = photo_info.get('upload_id')
+            entry = self._uploads.get(upload_id)
+            if entry is not None:
+                self._uploads[upload_id] = (entry[0], entry[1], now)
+    
+    def _sweep_uploads(self):
+        """
+        Удаление загрузок, к которым предложение не обращалось дольше PHOTO_UPLOAD_TTL
+        
+        Если такое предложение всё же отправят, фото загрузится заново
+        (см. upload_photos).
+        """
+        deadline = time.monotonic() - PHOTO_UPLOAD_TTL
+        expired = [upload_id for upload_id, (_, _, started) in self._uploads.items() if started < deadline]
+        for upload_id in expired:
+            self._discard_upload(upload_id)
+        if expired:
+            logger.info(f"Удалено брошенных загрузок фото: {len(expired)}")
+    
+    def _discard_upload(self, upload_id: Optional[str]):
+        entry = self._uploads.pop(upload_id, None)
+        if entry is None:
+            return
+        
+        task, filename, _ = entry
+        task.cancel()
+        cleanup = asyncio.create_task(self._cleanup_upload(task, filename))
+        self._cleanup_tasks.add(cleanup)
+        cleanup.add_done_callback(self._cleanup_tasks.discard)
+    
+    def discard_photo_uploads(self, photo_infos: list):
+        """Отмена фоновых загрузок и удаление уже загруженных файлов из S3"""
+        for photo_info in photo_infos or []:
+            self._discard_upload(photo_info.get('upload_id'))
+    
+    async def _cleanup_upload(self, task: asyncio.Task, filename: str):
+        """Удаление файла отменённой загрузки после её завершения"""
+        await asyncio.wait([task])
+        # Ранее сохранённый файл принадлежит другим предложениям
+        if not task.cancelled() and task.exception() is None and task.result().reused:
+            return
+        if task.cancelled() or task.exception() is None:
             try:
-                # Скачиваем фото из Telegram
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(photo_info['telegram_url']) as response:
-                        if response.status != 200:
-                            logger.error(f"Ошибка скачивания фото: {response.status}")
-                            continue
-                        
-                        photo_data = await response.read()
-                
-                # Генерируем уникальное имя файла
-                filename = self._generate_unique_filename(employee_name)
-                
-                # Загружаем в S3
-                await asyncio.get_event_loop().run_in_executor(
-                    None, 
-                    self._sync_upload_to_s3, 
-                    photo_data, 
-                    filename
-                )
-                
-                # Формируем публичную ссылку
-                public_url = f"{S3_ENDPOINT_URL}/{S3_BUCKET_NAME}/{filename}"
-                s3_urls.append(public_url)
-                
-                logger.info(f"Фото загружено в S3: {filename}")
-                
+                await asyncio.gather(self.storage.delete(filename), self.storage.delete(self._thumbnail_key(filename)))
+                logger.info(f"Фото отменённого предложения удалено из S3: {filename}")
             except Exception as e:
-                logger.error(f"Ошибка загрузки фото в S3: {e}")
+                logger.warning(f"Не удалось удалить {filename} из S3: {e}")
+    
+    async def _upload_fresh(self, bot: Bot, photo_info: dict, filename: str) -> StoredPhoto:
+        """Загрузка без фоновой задачи: ссылка Telegram могла устареть, запрашиваем новую"""
+        file = await bot.get_file(photo_info['file_id'])
+        photo_info = {**photo_info, 'telegram_url': f"https://api.telegram.org/file/bot{bot.token}/{file.file_path}"}
+        return await self._upload_photo(photo_info, filename)
+    
+    async def upload_photos(self, bot: Bot, photo_infos: list, employee_name: str) -> List[Tuple[Optional[StoredPhoto], Optional[Exception]]]:
+        """
+        Параллельная загрузка фото в S3
+        
+        Фото, загрузка которых уже запущена через start_photo_upload,
+        не загружаются повторно - ожидается результат фоновой задачи.
+        
+        Returns:
+            List[Tuple[Optional[StoredPhoto], Optional[Exception]]]: (фото, ошибка) для каждого фото
+            в исходном порядке
+        """
+        if not photo_infos:
+            return []
+        
+        uploads = []
+        for photo_info in photo_infos:
+            entry = self._uploads.pop(photo_info.get('upload_id'), None)
+            if entry is not None:
+                uploads.append(entry[0])
+            else:
+                filename = self._generate_unique_filename(employee_name, self._file_extension())
+                uploads.append(self._upload_fresh(bot, photo_info, filename))
+        
+        results = await asyncio.gather(*uploads, return_exceptions=True)
+        
+        uploads = []
+        for index, (photo_info, result) in enumerate(zip(photo_infos, results), 1):
+            if isinstance(result, BaseException):
+                logger.error(f"Ошибка загрузки фото {index}/{len(photo_infos)} ({photo_info.get('file_id')}) в S3: {result}")
+                uploads.append((None, result))
+            else:
+                uploads.append((result, None))
+        
+        return uploads
+    
+    async def delete_photos(self, photos: List[StoredPhoto]):
+        """Удаление из хранилища фото несохранённого предложения (кроме использованных повторно)"""
+        keys = []
+        for photo in photos:
+            if photo.reused or not photo.key:
                 continue
+            keys.append(photo.key)
+            if photo.thumbnail_url:
+                keys.append(self._thumbnail_key(photo.key))
         
-        return s3_urls
+        results = await asyncio.gather(*(self.storage.delete(key) for key in keys), return_exceptions=True)
+        for key, result in zip(keys, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"Не удалось удалить {key} из хранилища: {result}")
+        if keys:
+            logger.info(f"Фото несохранённого предложения удалены из хранилища: {len(keys)} файлов")
     
     async def process_voice_message(self, bot: Bot, voice: Voice) -> Optional[str]:
         """Распознавание голосового сообщения в текст"""
-        ogg_path = None
-        wav_path = None
-        
         try:
-            # Скачиваем голосовое сообщение
+            # Скачиваем голосовое сообщение в память
             file_info = await bot.get_file(voice.file_id)
-            ogg_path = os.path.join(tempfile.gettempdir(), f"voice_{voice.file_id}.ogg")
-            wav_path = os.path.join(tempfile.gettempdir(), f"voice_{voice.file_id}.wav")
-            
-            await bot.download_file(file_info.file_path, ogg_path)
+            audio = await bot.download_file(file_info.file_path)
             
-            # Конвертируем в WAV в отдельном потоке
-            await asyncio.get_event_loop().run_in_executor(
-                None, self._convert_ogg_to_wav, ogg_path, wav_path
-            )
+            # Голосовые всегда OGG/Opus и декодируются через каналы ffmpeg;
+            # аудиофайлы (MP4/M4A и др.) - через временный файл
+            mime_type = voice.mime_type or ('audio/ogg' if isinstance(voice, Voice) else None)
+            decoded = await decode_with_silences(audio.getvalue(), mime_type=mime_type)
             
-            # Распознаем речь в отдельном потоке
-            text = await asyncio.get_event_loop().run_in_executor(
-                None, self._recognize_speech, wav_path
-            )
+            # Распознаём речь выбранным движком (см. utils/speech.py)
+            text = await self._recognize(decoded)
+            if not text:
+                logger.warning("Не удалось распознать речь в голосовом сообщении")
+                return None
             
-            logger.info(f"Голосовое сообщение распознано: {len(text) if text else 0} символов")
+            logger.info(f"Голосовое сообщение распознано: {len(text)} символов")
             return text
             
         except Exception as e:
             logger.error(f"Ошибка обработки голосового сообщения: {e}")
             return None
-        finally:
-            # Очищаем временные файлы
-            for file_path in [ogg_path, wav_path]:
-                if file_path and os.path.exists(file_path):
-                    try:
-                        os.remove(file_path)
-                    except Exception as e:
-                        logger.warning(f"Не удалось удалить временный файл {file_path}: {e}")
-    
-    def _convert_ogg_to_wav(self, ogg_path: str, wav_path: str):
-        """Конвертация OGG в WAV"""
-        try:
-            audio = AudioSegment.from_file(ogg_path)
-            audio.export(wav_path, format="wav")
-        except Exception as e:
-            logger.error(f"Ошибка конвертации аудио: {e}")
-            raise
     
-    def _recognize_speech(self, wav_path: str) -> Optional[str]:
-        """Распознавание речи из WAV файла"""
-        try:
-            recognizer = sr.Recognizer()
-            
-            with sr.AudioFile(wav_path) as source:
-                # Настройка для лучшего распознавания
-                recognizer.adjust_for_ambient_noise(source, duration=0.5)
-                audio_data = recognizer.record(source)
-            
-            # Распознавание с помощью Google Speech API
-            text = recognizer.recognize_google(audio_data, language="ru-RU")
-            return text
-            
-        except sr.UnknownValueError:
-            logger.warning("Не удалось распознать речь в голосовом сообщении")
-            return None
-        except sr.RequestError as e:
-            logger.error(f"Ошибка запроса к сервису распознавания: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Неожиданная ошибка распознавания речи: {e}")
-            return None
\ No newline at end of file
+    async def _recognize(self, audio: DecodedAudio) -> Optional[str]:
+        """
+        Распознавание записи; длинная запись режется по паузам
+        
+        Фрагменты распознаются параллельно (параллельность ограничивают
+        пулы движка) и склеиваются по порядку. Ошибка одного фрагмента
+        не теряет остальные.
+        """
+        if audio.duration <= SPEECH_SEGMENT_SECONDS:
+            return await self.speech_engine.recognize(audio.pcm, audio.sample_rate)
+        
+        segments = split_on_silence(audio, SPEECH_SEGMENT_SECONDS)
+        logger.info(f"Голосовое {audio.duration:.0f} с разбито на фрагментов: {len(segments)}")
+        results = await asyncio.gather(
+            *(self.speech_engine.recognize(segment, audio.sample_rate) for segment in segments),
+            return_exceptions=True
+        )
+        
+        texts = []
+        for number, result in enumerate(results, start=1):
+            if isinstance(result, Exception):
+                logger.warning(f"Фрагмент {number}/{len(results)} не распознан: {result}")
+            elif result:
+                texts.append(result)
+        
+        if not texts and any(isinstance(result, Exception) for result in results):
+            # Все фрагменты с ошибкой - как ошибка распознавания целой записи
+            raise next(result for result in results if isinstance(result, Exception))
+        return ' '.join(texts) or None
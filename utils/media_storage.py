@@ -0,0 +1,349 @@
+"""
+Хранилища медиафайлов
+
+MediaStorage - общий интерфейс: потоковое сохранение, удаление и
+публичная ссылка. Реализации:
+    S3Storage    - S3-совместимое хранилище через aiohttp (подпись SigV4
+                   средствами botocore), части multipart грузятся параллельно
+    LocalStorage - каталог на диске (тесты и небольшие установки)
+
+Выбор реализации - MEDIA_STORAGE в settings/config.py.
+"""
+import asyncio
+import logging
+import os
+import uuid
+import xml.etree.ElementTree as ElementTree
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import aiohttp
+from botocore.auth import S3SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.credentials import Credentials
+from multidict import CIMultiDictProxy
+from yarl import URL
+
+from settings.config import (
+    MEDIA_STORAGE, MEDIA_LOCAL_DIR, MEDIA_PUBLIC_URL,
+    S3_ENDPOINT_URL, S3_BUCKET_NAME, S3_ACCESS_KEY, S3_SECRET_KEY, S3_REGION,
+    S3_ACL, S3_PUBLIC_URL, S3_PART_SIZE, S3_PART_CONCURRENCY, MAX_PHOTO_SIZE
+)
+from utils.executors import executors
+
+logger = logging.getLogger(__name__)
+
+S3_XML_NAMESPACE = '{http://s3.amazonaws.com/doc/2006-03-01/}'
+
+
+class MediaTooLargeError(Exception):
+    """Файл превышает MAX_PHOTO_SIZE"""
+
+
+class StorageError(Exception):
+    """Ошибка ответа хранилища"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class MediaStorage(ABC):
+    """Хранилище медиафайлов"""
+
+    @abstractmethod
+    async def save(
+        self,
+        key: str,
+        chunks: AsyncIterator[bytes],
+        content_type: str = 'image/jpeg',
+        max_size: int = MAX_PHOTO_SIZE
+    ) -> int:
+        """
+        Потоковое сохранение файла
+
+        При ошибке или отмене частично записанные данные удаляются.
+
+        Args:
+            key: Путь файла в хранилище
+            chunks: Содержимое файла по частям
+            content_type: MIME-тип
+            max_size: Максимальный размер; при превышении - MediaTooLargeError
+
+        Returns:
+            int: Размер сохранённого файла в байтах
+        """
+
+    async def save_bytes(self, key: str, data: bytes, content_type: str = 'image/jpeg') -> int:
+        """Сохранение файла, уже находящегося в памяти"""
+        async def chunks():
+            yield data
+        return await self.save(key, chunks(), content_type, max_size=len(data))
+
+    @abstractmethod
+    async def delete(self, key: str):
+        """Удаление файла"""
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        """Публичная ссылка на файл"""
+
+    def set_session(self, session: aiohttp.ClientSession):
+        """Использование внешней HTTP-сессии (если хранилищу она нужна)"""
+
+    async def close(self):
+        """Освобождение ресурсов"""
+
+
+class S3Storage(MediaStorage):
+    """
+    S3-совместимое хранилище на aiohttp
+
+    Запросы идут через общую HTTP-сессию (пул keep-alive соединений).
+    Файлы меньше part_size загружаются одним PUT, остальные - multipart,
+    до part_concurrency частей одновременно. В памяти держится не больше
+    part_concurrency + 1 частей.
+    """
+
+    def __init__(
+        self,
+        session: Optional[aiohttp.ClientSession] = None,
+        endpoint_url: str = S3_ENDPOINT_URL,
+        bucket: str = S3_BUCKET_NAME,
+        access_key: str = S3_ACCESS_KEY,
+        secret_key: str = S3_SECRET_KEY,
+        region: str = S3_REGION,
+        acl: str = S3_ACL,
+        public_url: str = S3_PUBLIC_URL,
+        part_size: int = S3_PART_SIZE,
+        part_concurrency: int = S3_PART_CONCURRENCY
+    ):
+        self.endpoint_url = endpoint_url.rstrip('/')
+        self.bucket = bucket
+        self.acl = acl
+        self.public_url = (public_url or f"{self.endpoint_url}/{bucket}").rstrip('/')
+        self.part_size = part_size
+        self.part_concurrency = max(1, part_concurrency)
+        self._auth = S3SigV4Auth(Credentials(access_key, secret_key), 's3', region)
+        self._session = session
+        self._owns_session = False
+
+    def set_session(self, session: aiohttp.ClientSession):
+        """Использование внешней HTTP-сессии (закрывает её владелец)"""
+        self._session = session
+        self._owns_session = False
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+            self._owns_session = True
+        return self._session
+
+    async def close(self):
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def url(self, key: str) -> str:
+        return f"{self.public_url}/{key}"
+
+    def _object_url(self, key: str, query: str = '') -> str:
+        url = f"{self.endpoint_url}/{self.bucket}/{quote(key, safe='/~')}"
+        return f"{url}?{query}" if query else url
+
+    async def _request(
+        self,
+        method: str,
+        key: str,
+        query: str = '',
+        data: bytes = b'',
+        headers: Optional[Dict[str, str]] = None
+    ) -> Tuple[CIMultiDictProxy, bytes]:
+        """
+        Подписанный запрос к объекту
+
+        Returns:
+            Tuple[CIMultiDictProxy, bytes]: Заголовки и тело ответа
+        """
+        url = self._object_url(key, query)
+        request = AWSRequest(method=method, url=url, data=data, headers=headers or {})
+        self._auth.add_auth(request)
+
+        async with self._get_session().request(
+            method, URL(url, encoded=True), data=data, headers=dict(request.headers.items())
+        ) as response:
+            body = await response.read()
+            if response.status >= 300:
+                raise StorageError(response.status, body.decode(errors='replace'))
+            return response.headers, body
+
+    def _object_headers(self, content_type: str) -> Dict[str, str]:
+        headers = {'Content-Type': content_type}
+        if self.acl:
+            headers['x-amz-acl'] = self.acl
+        return headers
+
+    async def _create_multipart(self, key: str, content_type: str) -> str:
+        _, body = await self._request('POST', key, 'uploads', headers=self._object_headers(content_type))
+        root = ElementTree.fromstring(body)
+        return root.findtext(f'{S3_XML_NAMESPACE}UploadId') or root.findtext('UploadId')
+
+    async def _upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> Dict:
+        headers, _ = await self._request(
+            'PUT', key, f"partNumber={part_number}&uploadId={quote(upload_id, safe='')}", data
+        )
+        return {'PartNumber': part_number, 'ETag': headers['ETag']}
+
+    async def _complete_multipart(self, key: str, upload_id: str, parts: List[Dict]):
+        body = ''.join(
+            f"<Part><PartNumber>{part['PartNumber']}</PartNumber><ETag>{part['ETag']}</ETag></Part>"
+            for part in sorted(parts, key=lambda part: part['PartNumber'])
+        )
+        await self._request(
+            'POST', key, f"uploadId={quote(upload_id, safe='')}",
+            f"<CompleteMultipartUpload>{body}</CompleteMultipartUpload>".encode()
+        )
+
+    async def _abort_multipart(self, key: str, upload_id: str):
+        try:
+            await self._request('DELETE', key, f"uploadId={quote(upload_id, safe='')}")
+        except Exception as e:
+            logger.warning(f"Ошибка отмены multipart-загрузки {key}: {e}")
+
+    async def save(
+        self,
+        key: str,
+        chunks: AsyncIterator[bytes],
+        content_type: str = 'image/jpeg',
+        max_size: int = MAX_PHOTO_SIZE
+    ) -> int:
+        buffer = bytearray()
+        total_size = 0
+        upload_id = None
+        part_tasks: List[asyncio.Task] = []
+        slots = asyncio.Semaphore(self.part_concurrency)
+
+        async def upload_part(part_number: int, data: bytes) -> Dict:
+            try:
+                return await self._upload_part(key, upload_id, part_number, data)
+            finally:
+                slots.release()
+
+        async def start_part(data: bytes):
+            # Ждём свободный слот: ограничивает и параллельность, и память
+            await slots.acquire()
+            part_tasks.append(asyncio.create_task(upload_part(len(part_tasks) + 1, data)))
+
+        try:
+            async for chunk in chunks:
+                total_size += len(chunk)
+                if total_size > max_size:
+                    raise MediaTooLargeError(f"Размер файла превышает {max_size}")
+
+                buffer += chunk
+                if len(buffer) < self.part_size:
+                    continue
+
+                if upload_id is None:
+                    upload_id = await self._create_multipart(key, content_type)
+                await start_part(bytes(buffer))
+                buffer.clear()
+
+            if upload_id is None:
+                await self._request('PUT', key, data=bytes(buffer), headers=self._object_headers(content_type))
+            else:
+                if buffer:
+                    await start_part(bytes(buffer))
+                parts = await asyncio.gather(*part_tasks)
+                await self._complete_multipart(key, upload_id, parts)
+
+        except BaseException:
+            for task in part_tasks:
+                task.cancel()
+            if part_tasks:
+                await asyncio.gather(*part_tasks, return_exceptions=True)
+            if upload_id is not None:
+                await asyncio.shield(self._abort_multipart(key, upload_id))
+            raise
+
+        return total_size
+
+    async def delete(self, key: str):
+        await self._request('DELETE', key)
+
+
+class LocalStorage(MediaStorage):
+    """
+    Хранилище в каталоге на диске
+
+    Файл пишется во временный файл рядом и переименовывается после
+    успешной записи. Запись на диск идёт в пуле storage.
+    """
+
+    def __init__(self, root: str = MEDIA_LOCAL_DIR, public_url: str = MEDIA_PUBLIC_URL):
+        self.root = os.path.abspath(root)
+        self.public_url = public_url.rstrip('/')
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise ValueError(f"Недопустимый путь файла: {key}")
+        return path
+
+    def url(self, key: str) -> str:
+        if self.public_url:
+            return f"{self.public_url}/{key}"
+        return URL.build(scheme='file', path=self._path(key)).human_repr()
+
+    @staticmethod
+    def _open(path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return open(path, 'wb')
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    async def save(
+        self,
+        key: str,
+        chunks: AsyncIterator[bytes],
+        content_type: str = 'image/jpeg',
+        max_size: int = MAX_PHOTO_SIZE
+    ) -> int:
+        path = self._path(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.part"
+        total_size = 0
+
+        file = await executors.run('storage', self._open, temp_path)
+        try:
+            try:
+                async for chunk in chunks:
+                    total_size += len(chunk)
+                    if total_size > max_size:
+                        raise MediaTooLargeError(f"Размер файла превышает {max_size}")
+                    await executors.run('storage', file.write, chunk)
+            finally:
+                await asyncio.shield(executors.run('storage', file.close))
+            await executors.run('storage', os.replace, temp_path, path)
+        except BaseException:
+            await asyncio.shield(executors.run('storage', self._remove, temp_path))
+            raise
+
+        return total_size
+
+    async def delete(self, key: str):
+        await executors.run('storage', self._remove, self._path(key))
+
+
+def create_media_storage(session: Optional[aiohttp.ClientSession] = None) -> MediaStorage:
+    """Хранилище, выбранное в MEDIA_STORAGE"""
+    if MEDIA_STORAGE == 'local':
+        return LocalStorage()
+    if MEDIA_STORAGE == 's3':
+        return S3Storage(session)
+    raise ValueError(f"Неизвестное хранилище медиафайлов: {MEDIA_STORAGE}")
@@ -0,0 +1,170 @@
+"""Ограничение частоты исходящих запросов (token bucket)"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+from settings.config import (
+    SHEETS_READ_RATE_PER_MINUTE, SHEETS_WRITE_RATE_PER_MINUTE,
+    TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST
+)
+
+logger = logging.getLogger(__name__)
+
+# Бакеты, не использовавшиеся дольше этого времени, удаляются
+IDLE_BUCKET_TTL = 600
+MAX_BUCKETS = 1000
+
+
+class TokenBucket:
+    """
+    Token bucket с очередью ожидания в порядке поступления
+
+    rate - токенов в секунду, capacity - допустимый всплеск.
+    block() приостанавливает выдачу токенов (например, по Retry-After).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+        self.last_used = self._updated
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def block(self, seconds: float):
+        """Запрет запросов на заданное время"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self, tokens: float = 1) -> float:
+        """
+        Получение токенов с ожиданием
+
+        Returns:
+            float: Время ожидания в секундах
+        """
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+
+                if now < self._blocked_until:
+                    delay = self._blocked_until - now
+                elif self._tokens >= tokens:
+                    self._tokens -= tokens
+                    break
+                else:
+                    delay = (tokens - self._tokens) / self.rate
+
+                await asyncio.sleep(delay)
+
+        self.last_used = time.monotonic()
+        return self.last_used - started
+
+
+class WaitStats:
+    """Статистика ожидания в очереди лимитера"""
+
+    def __init__(self):
+        self.count = 0
+        self.delayed = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, waited: float):
+        self.count += 1
+        self.delayed += int(waited > 0.001)
+        self.total += waited
+        self.max = max(self.max, waited)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'delayed': self.delayed,
+            'avg_wait': self.total / self.count if self.count else 0.0,
+            'max_wait': self.max
+        }
+
+
+class RateLimiter:
+    """
+    Набор token bucket по направлениям
+
+    Направление - строка вида "sheets_write" или "telegram_chat:<chat_id>".
+    Для каждого направления задаётся предел (rate, capacity) по префиксу
+    до двоеточия; бакеты создаются по мере надобности.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]]):
+        self.limits = limits
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._stats: Dict[str, WaitStats] = {}
+
+    def _bucket(self, destination: str) -> Optional[TokenBucket]:
+        bucket = self._buckets.get(destination)
+        if bucket is not None:
+            return bucket
+
+        limit = self.limits.get(destination.split(':', 1)[0])
+        if limit is None:
+            return None
+
+        if len(self._buckets) >= MAX_BUCKETS:
+            self._prune()
+        bucket = self._buckets[destination] = TokenBucket(*limit)
+        return bucket
+
+    def _prune(self):
+        now = time.monotonic()
+        for destination, bucket in list(self._buckets.items()):
+            if ':' in destination and now - bucket.last_used > IDLE_BUCKET_TTL:
+                del self._buckets[destination]
+
+    async def acquire(self, *destinations: str) -> float:
+        """
+        Ожидание разрешения на запрос по всем указанным направлениям
+
+        Сначала берутся токены частных направлений (с двоеточием, например
+        лимит чата), затем общих. Иначе запрос, ждущий своего чата, уже
+        занял бы общий токен, и остальные чаты простаивали бы.
+
+        Returns:
+            float: Суммарное время ожидания в секундах
+        """
+        waited = 0.0
+        for destination in sorted(destinations, key=lambda destination: ':' not in destination):
+            bucket = self._bucket(destination)
+            if bucket is None:
+                continue
+            waited += await bucket.acquire()
+
+        stats_key = destinations[0].split(':', 1)[0] if destinations else ''
+        self._stats.setdefault(stats_key, WaitStats()).record(waited)
+        if waited > 1:
+            logger.info(f"Ожидание лимита {', '.join(destinations)}: {waited:.1f} с")
+        return waited
+
+    def block(self, destination: str, seconds: float):
+        """Учёт Retry-After: направление блокируется на заданное время"""
+        bucket = self._bucket(destination)
+        if bucket is not None:
+            bucket.block(seconds)
+            logger.warning(f"Лимит {destination}: пауза {seconds:.1f} с по Retry-After")
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Время ожидания в очереди по направлениям"""
+        return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+
+rate_limiter = RateLimiter({
+    'sheets_read': (SHEETS_READ_RATE_PER_MINUTE / 60, SHEETS_READ_RATE_PER_MINUTE / 60 * 10),
+    'sheets_write': (SHEETS_WRITE_RATE_PER_MINUTE / 60, SHEETS_WRITE_RATE_PER_MINUTE / 60 * 10),
+    'telegram': (TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_RATE),
+    'telegram_chat': (TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST)
+})
@@ -0,0 +1,198 @@
+"""Асинхронный клиент Google Sheets API v4 на aiohttp"""
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+import aiohttp
+from google.auth import crypt, jwt
+
+from settings.config import SHEETS_API_URL, SHEETS_MAX_RETRIES
+from utils.rate_limiter import RateLimiter, rate_limiter
+
+logger = logging.getLogger(__name__)
+
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
+
+# Запас до истечения токена, после которого он обновляется заранее
+TOKEN_REFRESH_MARGIN = 60
+
+
+class SheetsAPIError(Exception):
+    """Ошибка ответа Google Sheets API"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class ServiceAccountToken:
+    """
+    Access token сервисного аккаунта
+
+    JWT подписывается локально ключом из файла сервисного аккаунта
+    и обменивается на access token. Токен кэшируется до истечения.
+    """
+
+    def __init__(self, credentials_file: str, scopes: List[str] = SCOPES):
+        with open(credentials_file, 'r', encoding='utf-8') as f:
+            info = json.load(f)
+
+        self.client_email = info['client_email']
+        self.token_uri = info.get('token_uri', 'https://oauth2.googleapis.com/token')
+        self.scopes = scopes
+        self._signer = crypt.RSASigner.from_service_account_info(info)
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._expires_at = 0.0
+
+    async def get(self, session: aiohttp.ClientSession) -> str:
+        """Действующий access token (обновляется при необходимости)"""
+        if self._token and time.time() < self._expires_at - TOKEN_REFRESH_MARGIN:
+            return self._token
+
+        async with self._lock:
+            if self._token and time.time() < self._expires_at - TOKEN_REFRESH_MARGIN:
+                return self._token
+
+            now = int(time.time())
+            assertion = jwt.encode(self._signer, {
+                'iss': self.client_email,
+                'scope': ' '.join(self.scopes),
+                'aud': self.token_uri,
+                'iat': now,
+                'exp': now + 3600
+            })
+            if isinstance(assertion, bytes):
+                assertion = assertion.decode()
+
+            async with session.post(self.token_uri, data={
+                'grant_type': 'urn:ietf:params:oauth:grant-type:jwt-bearer',
+                'assertion': assertion
+            }) as response:
+                body = await response.json(content_type=None)
+                if response.status != 200:
+                    raise SheetsAPIError(response.status, body.get('error_description') or str(body))
+
+            self._token = body['access_token']
+            self._expires_at = now + int(body.get('expires_in', 3600))
+            logger.info("Access token Google получен")
+            return self._token
+
+
+class AsyncSheetsClient:
+    """Минимальный набор методов Sheets API v4, нужный боту"""
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        token: ServiceAccountToken,
+        spreadsheet_id: str,
+        base_url: str = SHEETS_API_URL,
+        limiter: RateLimiter = rate_limiter
+    ):
+        self.session = session
+        self.token = token
+        self.spreadsheet_id = spreadsheet_id
+        self.base_url = base_url.rstrip('/')
+        self.limiter = limiter
+
+    async def _request(self, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        url = f"{self.base_url}/spreadsheets/{self.spreadsheet_id}{path}"
+        # Квоты Sheets на чтение и запись считаются отдельно
+        destination = 'sheets_read' if method == 'GET' else 'sheets_write'
+        token_refreshed = False
+        retries = 0
+
+        while True:
+            await self.limiter.acquire(destination)
+            headers = {'Authorization': f"Bearer {await self.token.get(self.session)}"}
+            async with self.session.request(method, url, headers=headers, **kwargs) as response:
+                # Токен отозван или истёк раньше срока - обновляем один раз
+                if response.status == 401 and not token_refreshed:
+                    self.token.invalidate()
+                    token_refreshed = True
+                    continue
+
+                # Превышена квота - ждём, сколько просит сервер
+                if response.status == 429 and retries < SHEETS_MAX_RETRIES:
+                    retries += 1
+                    self.limiter.block(destination, self._retry_after(response, retries))
+                    continue
+
+                body = await response.json(content_type=None) or {}
+                if response.status >= 400:
+                    error = body.get('error', {})
+                    raise SheetsAPIError(response.status, error.get('message') or str(body))
+                return body
+
+    @staticmethod
+    def _retry_after(response: aiohttp.ClientResponse, attempt: int) -> float:
+        try:
+            return float(response.headers['Retry-After'])
+        except (KeyError, ValueError):
+            return float(2 ** attempt)
+
+    @staticmethod
+    def _range_path(range_name: str) -> str:
+        return quote(range_name, safe='')
+
+    async def get_sheet_titles(self) -> List[str]:
+        body = await self._request('GET', '', params={'fields': 'sheets.properties.title'})
+        return [sheet['properties']['title'] for sheet in body.get('sheets', [])]
+
+    async def add_sheet(self, title: str, rows: int = 1000, cols: int = 26) -> Dict[str, Any]:
+        return await self._request('POST', ':batchUpdate', json={
+            'requests': [{
+                'addSheet': {
+                    'properties': {
+                        'title': title,
+                        'gridProperties': {'rowCount': rows, 'columnCount': cols}
+                    }
+                }
+            }]
+        })
+
+    async def get_values(self, range_name: str, unformatted: bool = False) -> List[List[Any]]:
+        # unformatted: числа как есть, даты и время - серийными числами
+        # (дни от 30.12.1899), независимо от формата ячеек и локали таблицы
+        params = {}
+        if unformatted:
+            params = {'valueRenderOption': 'UNFORMATTED_VALUE', 'dateTimeRenderOption': 'SERIAL_NUMBER'}
+        body = await self._request('GET', f"/values/{self._range_path(range_name)}", params=params)
+        return body.get('values', [])
+
+    async def update_values(
+        self,
+        range_name: str,
+        values: List[List[Any]],
+        value_input_option: str = 'USER_ENTERED'
+    ) -> Dict[str, Any]:
+        return await self._request(
+            'PUT',
+            f"/values/{self._range_path(range_name)}",
+            params={'valueInputOption': value_input_option},
+            json={'range': range_name, 'majorDimension': 'ROWS', 'values': values}
+        )
+
+    async def append_values(
+        self,
+        range_name: str,
+        values: List[List[Any]],
+        value_input_option: str = 'USER_ENTERED'
+    ) -> Dict[str, Any]:
+        return await self._request(
+            'POST',
+            f"/values/{self._range_path(range_name)}:append",
+            params={'valueInputOption': value_input_option, 'insertDataOption': 'INSERT_ROWS'},
+            json={'majorDimension': 'ROWS', 'values': values}
+        )
@@ -0,0 +1,282 @@
+"""
+Сверка жалоб из базы с Google Sheets и дозаливка пропущенных строк
+
+В колонку ID листа пишется ID жалобы. Сверка идёт от сохранённой отметки
+(последний ID, до которого все жалобы точно есть в листе): из базы
+читаются только более новые жалобы, из листа - колонка ID листов их
+периодов. Недостающие строки записываются большими диапазонами.
+
+При первом запуске отметка ставится на последнюю жалобу в базе: история
+сверяется только по явному запросу (--from-id 0).
+
+Запуск вручную (например, дозаливка истории):
+    python -m utils.sheets_reconcile [--from-id N] [--dry-run]
+
+Ручной запуск пишет в лист мимо бота, поэтому отказывается работать,
+пока бот запущен (см. WRITER_HEARTBEAT_KEY).
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from settings.config import SHEETS_RECONCILE_PAGE, SHEETS_COLUMNS
+from settings.database import Database
+from utils.google_sheets import GoogleSheetsManager, MOSCOW_TZ, column_index
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_KEY = 'sheets_reconciled_id'
+
+# Время последнего сигнала бота, пишущего в лист (SheetsSyncWorker)
+WRITER_HEARTBEAT_KEY = 'sheets_writer_heartbeat'
+WRITER_HEARTBEAT_INTERVAL = 10
+# Без сигнала дольше этого бот считается остановленным
+WRITER_HEARTBEAT_TIMEOUT = 3 * WRITER_HEARTBEAT_INTERVAL
+
+# Строки, записанные до появления колонки ID, узнаются по содержимому
+# и времени: время в листе ставилось после загрузки фото и записи в базу,
+# с точностью до минуты, поэтому сравнивается с окном
+LEGACY_KEY_COLUMNS = ('CATEGORY', 'MASTER', 'COMMENT')
+LEGACY_TIME_WINDOW = timedelta(minutes=2)
+
+# Начало отсчёта серийных дат Google Sheets
+SHEETS_EPOCH = datetime(1899, 12, 30)
+DATE_FORMATS = ('%d.%m.%Y', '%Y-%m-%d', '%d/%m/%Y')
+TIME_FORMATS = ('%H:%M:%S', '%H:%M')
+
+
+def _cell(row: List[Any], name: str) -> Any:
+    index = column_index(SHEETS_COLUMNS[name]) - 1
+    return row[index] if index < len(row) else ''
+
+
+def _parse_date(value: Any) -> Optional[datetime]:
+    if isinstance(value, (int, float)):
+        return SHEETS_EPOCH + timedelta(days=int(value))
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), date_format)
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_time(value: Any) -> Optional[timedelta]:
+    if isinstance(value, (int, float)):
+        # Только доля суток: целая часть - дата, если ячейку ввели с датой
+        return timedelta(seconds=round(value % 1 * 86400))
+    for time_format in TIME_FORMATS:
+        try:
+            parsed = datetime.strptime(str(value).strip(), time_format)
+        except ValueError:
+            continue
+        return timedelta(hours=parsed.hour, minutes=parsed.minute, seconds=parsed.second)
+    return None
+
+
+def legacy_moment(date_value: Any, time_value: Any) -> Optional[datetime]:
+    """Московское время строки листа (без часового пояса) или None, если не разобрать"""
+    date = _parse_date(date_value)
+    time_of_day = _parse_time(time_value)
+    if date is None or time_of_day is None:
+        return None
+    return date.replace(hour=0, minute=0, second=0, microsecond=0) + time_of_day
+
+
+def legacy_key(category: Any, master: Any, comment: Any) -> Tuple[str, ...]:
+    return tuple(str(value).strip() for value in (category, master, comment))
+
+
+class WorksheetIndex:
+    """Жалобы, уже присутствующие в листе"""
+
+    def __init__(self, ids: Set[int], has_legacy_rows: bool):
+        self.ids = ids
+        self.has_legacy_rows = has_legacy_rows
+        # Заполняется при первой необходимости: полное чтение листа дорогое.
+        # Ключ по содержимому -> время строк (None - время не разобрано)
+        self.legacy_rows: Optional[Dict[Tuple[str, ...], List[Optional[datetime]]]] = None
+
+    def take_legacy(self, key: Tuple[str, ...], moment: datetime) -> bool:
+        """Поиск и исключение строки без ID, совпадающей с жалобой"""
+        moments = self.legacy_rows.get(key)
+        if not moments:
+            return False
+        for index, row_moment in enumerate(moments):
+            if row_moment is None or abs(row_moment - moment) <= LEGACY_TIME_WINDOW:
+                del moments[index]
+                return True
+        return False
+
+
+class SheetsReconciler:
+    """Поиск и дозапись жалоб, которых нет в Google Sheets"""
+
+    def __init__(self, db: Database, sheets_manager: GoogleSheetsManager, page_size: int = SHEETS_RECONCILE_PAGE):
+        self.db = db
+        self.sheets_manager = sheets_manager
+        self.page_size = max(1, page_size)
+
+    async def _index_worksheet(self, title: str) -> WorksheetIndex:
+        """Чтение колонки ID листа"""
+        id_column = SHEETS_COLUMNS['ID']
+        values = await self.sheets_manager.read_rows(title, f"{id_column}:{id_column}", unformatted=True)
+
+        ids = set()
+        has_legacy_rows = False
+        # Первая строка - заголовок
+        for row in values[1:]:
+            value = str(row[0]).strip() if row else ''
+            if value.isdigit():
+                ids.add(int(value))
+            else:
+                has_legacy_rows = True
+        return WorksheetIndex(ids, has_legacy_rows)
+
+    async def _load_legacy_rows(self, title: str, index: WorksheetIndex):
+        """
+        Строки без ID (записанные до появления колонки ID)
+
+        Лист читается без форматирования: дата и время приходят
+        серийными числами, а не строкой в формате и локали таблицы.
+        """
+        rows = await self.sheets_manager.read_rows(title, unformatted=True)
+        index.legacy_rows = {}
+        for row in rows[1:]:
+            if str(_cell(row, 'ID')).strip():
+                continue
+            key = legacy_key(*(_cell(row, name) for name in LEGACY_KEY_COLUMNS))
+            index.legacy_rows.setdefault(key, []).append(legacy_moment(_cell(row, 'DATE'), _cell(row, 'TIME')))
+
+    async def _init_watermark(self, dry_run: bool) -> Dict[str, int]:
+        watermark = await self.db.get_last_complaint_id()
+        if not dry_run:
+            await self.db.set_sync_state(WATERMARK_KEY, str(watermark))
+        logger.info(
+            f"Отметка сверки с Google Sheets установлена на жалобу {watermark}; "
+            f"историю можно сверить вручную с --from-id 0"
+        )
+        return {'checked': 0, 'missing': 0, 'written': 0, 'watermark': watermark}
+
+    async def reconcile(self, from_id: Optional[int] = None, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Сверка жалоб после отметки и дозапись недостающих
+
+        Если отметки ещё нет, она ставится на последнюю жалобу в базе
+        без сверки: полная история сверяется только с явным from_id.
+
+        Args:
+            from_id: Начать после этого ID вместо сохранённой отметки
+            dry_run: Только посчитать недостающие строки
+
+        Returns:
+            Dict[str, int]: checked, missing, written, watermark
+        """
+        if from_id is None:
+            stored = await self.db.get_sync_state(WATERMARK_KEY)
+            if stored is None:
+                return await self._init_watermark(dry_run)
+            from_id = int(stored)
+
+        watermark = from_id
+        # Отметка не сдвигается за жалобу, ещё ждущую записи в sheets_outbox
+        watermark_blocked = False
+        stats = {'checked': 0, 'missing': 0, 'written': 0}
+        indexes: Dict[str, WorksheetIndex] = {}
+        after_id = from_id
+
+        while True:
+            complaints = await self.db.get_complaints_after(after_id, self.page_size)
+            if not complaints:
+                break
+
+            first_id, last_id = complaints[0][0], complaints[-1][0]
+            # Эти жалобы запишет SheetsSyncWorker - не дублируем
+            pending = set(await self.db.get_unsynced_complaint_ids(first_id, last_id))
+            missing: Dict[str, List[List[str]]] = {}
+
+            for complaint_id, category, master, comment, photo_urls, thumbnail_urls, created_at in complaints:
+                stats['checked'] += 1
+                if complaint_id in pending:
+                    if not watermark_blocked:
+                        watermark = complaint_id - 1
+                        watermark_blocked = True
+                    continue
+
+                title, row = self.sheets_manager.complaint_row(
+                    category, master, comment, photo_urls, created_at, complaint_id, thumbnail_urls
+                )
+                index = indexes.get(title)
+                if index is None:
+                    index = indexes[title] = await self._index_worksheet(title)
+
+                if complaint_id in index.ids:
+                    continue
+
+                if index.has_legacy_rows:
+                    if index.legacy_rows is None:
+                        await self._load_legacy_rows(title, index)
+                    moment = created_at.astimezone(MOSCOW_TZ).replace(tzinfo=None)
+                    if index.take_legacy(legacy_key(category, master, comment), moment):
+                        continue
+
+                missing.setdefault(title, []).append(row)
+                index.ids.add(complaint_id)
+
+            for title, rows in missing.items():
+                stats['missing'] += len(rows)
+                if dry_run:
+                    continue
+                stats['written'] += await self.sheets_manager.write_rows(title, rows)
+                logger.info(f"Сверка: в лист {title} дописано строк: {len(rows)}")
+
+            if not watermark_blocked:
+                watermark = last_id
+            if not dry_run:
+                # Отметка сохраняется после каждой страницы - прерванная дозаливка продолжится с места
+                await self.db.set_sync_state(WATERMARK_KEY, str(watermark))
+
+            after_id = last_id
+
+        stats['watermark'] = watermark
+        logger.info(
+            f"Сверка с Google Sheets: проверено {stats['checked']}, "
+            f"не хватало {stats['missing']}, записано {stats['written']}, отметка {watermark}"
+        )
+        return stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Сверка жалоб из базы с Google Sheets")
+    parser.add_argument('--from-id', type=int, default=None,
+                        help="начать после этого ID жалобы (0 - вся история); "
+                             "без отметки и этого параметра отметка ставится на последнюю жалобу")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="только посчитать недостающие строки")
+    args = parser.parse_args()
+
+    db = Database()
+    sheets_manager = GoogleSheetsManager()
+    await db.initialize()
+    try:
+        heartbeat = float(await db.get_sync_state(WRITER_HEARTBEAT_KEY) or 0)
+        if time.time() - heartbeat < WRITER_HEARTBEAT_TIMEOUT:
+            parser.exit(1, "Бот запущен и пишет в Google Sheets - остановите его перед ручной сверкой\n")
+
+        await sheets_manager.initialize()
+        stats = await SheetsReconciler(db, sheets_manager).reconcile(args.from_id, args.dry_run)
+        print(
+            f"Проверено: {stats['checked']}, не хватало: {stats['missing']}, "
+            f"записано: {stats['written']}, отметка: {stats['watermark']}"
+        )
+    finally:
+        await sheets_manager.close()
+        await db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
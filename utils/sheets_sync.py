@@ -0,0 +1,170 @@
+"""Фоновая синхронизация очереди sheets_outbox с Google Sheets"""
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime
+from typing import Optional
+
+from settings.config import (
+    SHEETS_BATCH_SIZE, SHEETS_SYNC_INTERVAL,
+    SHEETS_RETRY_BASE_DELAY, SHEETS_RETRY_MAX_DELAY, SHEETS_RECONCILE_INTERVAL
+)
+from settings.database import Database
+from utils.google_sheets import GoogleSheetsManager
+from utils.sheets_reconcile import (
+    SheetsReconciler, WRITER_HEARTBEAT_KEY, WRITER_HEARTBEAT_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SheetsSyncWorker:
+    """
+    Перенос жалоб из sheets_outbox в Google Sheets
+
+    Жалоба попадает в очередь в одной транзакции с записью в complaints,
+    поэтому недоступность Google Sheets не теряет данные и не задерживает
+    пользователя. Неудачные записи повторяются с экспоненциальной паузой
+    и случайным разбросом; очередь переживает перезапуск бота.
+
+    Раз в reconcile_interval секунд, когда очередь пуста, запускается
+    сверка базы с листом (см. utils/sheets_reconcile.py).
+
+    Пока воркер работает, он раз в WRITER_HEARTBEAT_INTERVAL секунд
+    отмечается в sync_state - ручная сверка при этом не запускается.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        sheets_manager: GoogleSheetsManager,
+        batch_size: int = SHEETS_BATCH_SIZE,
+        poll_interval: float = SHEETS_SYNC_INTERVAL,
+        reconcile_interval: float = SHEETS_RECONCILE_INTERVAL
+    ):
+        self.db = db
+        self.sheets_manager = sheets_manager
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.reconcile_interval = reconcile_interval
+        self.reconciler = SheetsReconciler(db, sheets_manager)
+        self._last_reconcile = 0.0
+        self.synced = 0
+        self.failed = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="sheets-sync")
+        self._heartbeat_task = asyncio.create_task(self._heartbeat(), name="sheets-sync-heartbeat")
+        logger.info("Синхронизация с Google Sheets запущена")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        self._heartbeat_task.cancel()
+        await asyncio.gather(self._task, self._heartbeat_task, return_exceptions=True)
+        self._task = None
+        self._heartbeat_task = None
+        await self.db.set_sync_state(WRITER_HEARTBEAT_KEY, '0')
+        logger.info("Синхронизация с Google Sheets остановлена")
+
+    def wake(self):
+        """Запуск синхронизации, не дожидаясь интервала опроса"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def backlog(self) -> int:
+        """Количество жалоб, ожидающих записи в Google Sheets"""
+        return await self.db.get_sheets_backlog()
+
+    @staticmethod
+    def retry_delay(attempts: int) -> float:
+        """Пауза перед следующей попыткой: экспонента с разбросом"""
+        delay = min(SHEETS_RETRY_MAX_DELAY, SHEETS_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.sync_once()
+            except Exception as e:
+                logger.error(f"Ошибка синхронизации с Google Sheets: {e}")
+                processed = 0
+
+            # Полная пачка - вероятно, в очереди есть ещё записи
+            if processed >= self.batch_size:
+                continue
+
+            if processed == 0 and self._reconcile_due():
+                self._last_reconcile = time.monotonic()
+                try:
+                    await self.reconciler.reconcile()
+                except Exception as e:
+                    logger.error(f"Ошибка сверки с Google Sheets: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _heartbeat(self):
+        # Отдельная задача: долгая запись или сверка не должны гасить сигнал
+        while True:
+            await self.db.set_sync_state(WRITER_HEARTBEAT_KEY, str(time.time()))
+            await asyncio.sleep(WRITER_HEARTBEAT_INTERVAL)
+
+    def _reconcile_due(self) -> bool:
+        if self.reconcile_interval <= 0:
+            return False
+        return not self._last_reconcile or time.monotonic() - self._last_reconcile >= self.reconcile_interval
+
+    async def sync_once(self) -> int:
+        """
+        Одна пачка синхронизации
+
+        Returns:
+            int: Количество обработанных записей очереди
+        """
+        rows = await self.db.get_pending_sheets_rows(self.batch_size)
+        if not rows:
+            return 0
+
+        # Строки пачки уходят в буфер листа одновременно и пишутся одним диапазоном
+        results = await asyncio.gather(*(
+            self.sheets_manager.add_complaint(
+                category=payload['category'],
+                master=payload['master'],
+                comment=payload['comment'],
+                photo_urls=payload['photo_urls'],
+                thumbnail_urls=payload.get('thumbnail_urls'),
+                created_at=datetime.fromisoformat(payload['created_at']),
+                complaint_id=complaint_id
+            )
+            for _, complaint_id, payload, _ in rows
+        ))
+
+        synced_ids = [row_id for (row_id, _, _, _), success in zip(rows, results) if success]
+        await self.db.mark_sheets_synced(synced_ids)
+        self.synced += len(synced_ids)
+
+        for (row_id, complaint_id, _, attempts), success in zip(rows, results):
+            if success:
+                continue
+            attempts += 1
+            delay = self.retry_delay(attempts)
+            self.failed += 1
+            await self.db.mark_sheets_failed(row_id, attempts, time.time() + delay, "Ошибка записи в Google Sheets")
+            logger.warning(f"Жалоба {complaint_id} не записана в Google Sheets (попытка {attempts}), повтор через {delay:.0f} с")
+
+        if len(synced_ids) < len(rows):
+            logger.warning(f"Очередь Google Sheets: {await self.backlog()}")
+
+        return len(rows)
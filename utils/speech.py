@@ -0,0 +1,211 @@
+"""
+Движки распознавания речи
+
+SpeechEngine - общий интерфейс: PCM (s16le, моно) на входе, текст на
+выходе. Реализации:
+    GoogleSpeechEngine   - бесплатный веб-сервис Google (SpeechRecognition)
+    VoskSpeechEngine     - офлайн-модель Vosk; модель загружается один раз
+                           в каждом процессе пула и остаётся в памяти
+    FallbackSpeechEngine - основной движок с запасным при ошибке или
+                           пустом результате
+
+Выбор движка - SPEECH_ENGINE и SPEECH_FALLBACK_ENGINE в settings/config.py.
+Для vosk нужны пакет vosk и распакованная модель в VOSK_MODEL_PATH.
+"""
+import asyncio
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import speech_recognition as sr
+
+from settings.config import (
+    SPEECH_ENGINE, SPEECH_FALLBACK_ENGINE, SPEECH_LANGUAGE, SPEECH_SAMPLE_RATE,
+    VOSK_MODEL_PATH, VOSK_WORKERS
+)
+from utils.audio import SAMPLE_WIDTH
+from utils.executors import executors
+
+logger = logging.getLogger(__name__)
+
+# Объём PCM, передаваемый распознавателю Vosk за раз, секунды
+VOSK_CHUNK_SECONDS = 4
+
+# Модель Vosk в процессе пула (заполняется инициализатором воркера)
+_vosk_model = None
+
+
+class SpeechEngineError(Exception):
+    """Движок распознавания недоступен или вернул ошибку"""
+
+
+class SpeechEngine(ABC):
+    """Движок распознавания речи"""
+
+    name: str = ''
+
+    @property
+    def version(self) -> str:
+        """Движок и модель; меняется, когда результаты распознавания могут измениться"""
+        return self.name
+
+    async def start(self):
+        """Подготовка к работе (загрузка модели)"""
+
+    @abstractmethod
+    async def recognize(self, pcm: bytes, sample_rate: int = SPEECH_SAMPLE_RATE) -> Optional[str]:
+        """
+        Распознавание речи
+
+        Args:
+            pcm: PCM s16le, моно
+            sample_rate: Частота дискретизации, Гц
+
+        Returns:
+            Optional[str]: Текст или None, если речь не распознана
+
+        Raises:
+            SpeechEngineError: Движок недоступен
+        """
+
+    async def close(self):
+        """Освобождение ресурсов"""
+
+
+def _recognize_google(pcm: bytes, sample_rate: int, language: str) -> Optional[str]:
+    recognizer = sr.Recognizer()
+    audio_data = sr.AudioData(pcm, sample_rate, SAMPLE_WIDTH)
+    try:
+        return recognizer.recognize_google(audio_data, language=language)
+    except sr.UnknownValueError:
+        return None
+    except sr.RequestError as e:
+        raise SpeechEngineError(f"Ошибка запроса к сервису распознавания: {e}") from e
+
+
+class GoogleSpeechEngine(SpeechEngine):
+    """Веб-сервис Google; запросы выполняются в пуле потоков speech"""
+
+    name = 'google'
+
+    def __init__(self, language: str = SPEECH_LANGUAGE):
+        self.language = language
+
+    @property
+    def version(self) -> str:
+        return f"google-{self.language}"
+
+    async def recognize(self, pcm: bytes, sample_rate: int = SPEECH_SAMPLE_RATE) -> Optional[str]:
+        return await executors.run('speech', _recognize_google, pcm, sample_rate, self.language)
+
+
+def _load_vosk_model(model_path: str):
+    """Инициализатор процесса пула: загрузка модели"""
+    global _vosk_model
+    from vosk import Model, SetLogLevel
+
+    SetLogLevel(-1)
+    _vosk_model = Model(model_path)
+
+
+def _vosk_ready() -> bool:
+    return _vosk_model is not None
+
+
+def _recognize_vosk(pcm: bytes, sample_rate: int) -> str:
+    from vosk import KaldiRecognizer
+
+    recognizer = KaldiRecognizer(_vosk_model, sample_rate)
+    phrases = []
+    step = sample_rate * SAMPLE_WIDTH * VOSK_CHUNK_SECONDS
+    for start in range(0, len(pcm), step):
+        # True - закончилась фраза, её текст больше не вернётся в FinalResult
+        if recognizer.AcceptWaveform(pcm[start:start + step]):
+            phrases.append(json.loads(recognizer.Result()).get('text', ''))
+    phrases.append(json.loads(recognizer.FinalResult()).get('text', ''))
+    return ' '.join(phrase for phrase in phrases if phrase)
+
+
+class VoskSpeechEngine(SpeechEngine):
+    """
+    Офлайн-распознавание Vosk
+
+    Распознавание нагружает CPU, поэтому идёт в отдельном пуле процессов
+    vosk. Модель загружается инициализатором при старте воркера;
+    start() заранее запускает все воркеры, чтобы первое голосовое не
+    ждало загрузки модели.
+    """
+
+    name = 'vosk'
+
+    def __init__(self, model_path: str = VOSK_MODEL_PATH, workers: int = VOSK_WORKERS):
+        if not os.path.isdir(model_path):
+            raise ValueError(f"Модель Vosk не найдена: {model_path}")
+        self.model_path = model_path
+        self._executor = executors.register(
+            'vosk', 'process', workers, initializer=_load_vosk_model, initargs=(model_path,)
+        )
+
+    @property
+    def version(self) -> str:
+        return f"vosk-{os.path.basename(os.path.normpath(self.model_path))}"
+
+    async def start(self):
+        await asyncio.gather(*(self._executor.submit(_vosk_ready) for _ in range(self._executor.max_workers)))
+        logger.info(f"Модель Vosk загружена: {self.model_path} ({self._executor.max_workers} процессов)")
+
+    async def recognize(self, pcm: bytes, sample_rate: int = SPEECH_SAMPLE_RATE) -> Optional[str]:
+        try:
+            text = await self._executor.run(_recognize_vosk, pcm, sample_rate)
+        except Exception as e:
+            raise SpeechEngineError(f"Ошибка распознавания Vosk: {e}") from e
+        return text or None
+
+
+class FallbackSpeechEngine(SpeechEngine):
+    """Основной движок; при ошибке или пустом результате - запасной"""
+
+    def __init__(self, primary: SpeechEngine, fallback: SpeechEngine):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = primary.name
+
+    @property
+    def version(self) -> str:
+        return f"{self.primary.version}+{self.fallback.version}"
+
+    async def start(self):
+        await self.primary.start()
+        await self.fallback.start()
+
+    async def recognize(self, pcm: bytes, sample_rate: int = SPEECH_SAMPLE_RATE) -> Optional[str]:
+        try:
+            text = await self.primary.recognize(pcm, sample_rate)
+            if text:
+                return text
+            logger.info(f"Движок {self.primary.name} не распознал речь, пробуем {self.fallback.name}")
+        except SpeechEngineError as e:
+            logger.warning(f"{e}; пробуем {self.fallback.name}")
+        return await self.fallback.recognize(pcm, sample_rate)
+
+    async def close(self):
+        await self.primary.close()
+        await self.fallback.close()
+
+
+def _create_engine(name: str) -> SpeechEngine:
+    if name == 'google':
+        return GoogleSpeechEngine()
+    if name == 'vosk':
+        return VoskSpeechEngine()
+    raise ValueError(f"Неизвестный движок распознавания речи: {name}")
+
+
+def create_speech_engine(name: str = SPEECH_ENGINE, fallback: str = SPEECH_FALLBACK_ENGINE) -> SpeechEngine:
+    """Движок, выбранный в SPEECH_ENGINE, с запасным SPEECH_FALLBACK_ENGINE"""
+    engine = _create_engine(name)
+    if fallback and fallback != name:
+        return FallbackSpeechEngine(engine, _create_engine(fallback))
+    return engine
@@ -0,0 +1,76 @@
+"""
+Кэш распознанных голосовых сообщений
+
+Ключ - file_unique_id Telegram (одинаков у пересланных копий) и версия
+движка распознавания: после смены движка или модели голосовые
+распознаются заново. Последние тексты держатся в памяти (LRU), все -
+в таблице transcripts, ограниченной TRANSCRIPT_CACHE_DB_ROWS.
+"""
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from settings.config import TRANSCRIPT_CACHE_SIZE, TRANSCRIPT_CACHE_DB_ROWS
+from settings.database import Database
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptCache:
+    """LRU в памяти поверх таблицы transcripts"""
+
+    def __init__(self, db: Database, max_size: int = TRANSCRIPT_CACHE_SIZE, max_rows: int = TRANSCRIPT_CACHE_DB_ROWS):
+        self.db = db
+        self.max_size = max(1, max_size)
+        self.max_rows = max(1, max_rows)
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.db_evictions = 0
+        self._entries: 'OrderedDict[Tuple[str, str], str]' = OrderedDict()
+
+    def _remember(self, key: Tuple[str, str], text: str):
+        self._entries[key] = text
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, file_unique_id: str, engine_version: str) -> Optional[str]:
+        """Сохранённый текст или None"""
+        key = (file_unique_id, engine_version)
+        text = self._entries.get(key)
+        if text is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+        text = await self.db.get_transcript(file_unique_id, engine_version)
+        if text is None:
+            self.misses += 1
+            return None
+
+        self.db_hits += 1
+        self._remember(key, text)
+        # Обновляем used_at, чтобы запись не вытеснялась из таблицы
+        await self.db.touch_transcript(file_unique_id, engine_version)
+        return text
+
+    async def put(self, file_unique_id: str, engine_version: str, text: str):
+        """Сохранение распознанного текста"""
+        self._remember((file_unique_id, engine_version), text)
+        self.db_evictions += await self.db.save_transcript(file_unique_id, engine_version, text, self.max_rows)
+
+    def stats(self) -> Dict[str, float]:
+        """Попадания (в памяти и в базе), промахи и вытеснения"""
+        total = self.hits + self.db_hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'db_hits': self.db_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.db_hits) / total if total else 0.0,
+            'evictions': self.evictions,
+            'db_evictions': self.db_evictions
+        }